@@ -0,0 +1,208 @@
+"""
+Query service over the timeseries and aggregates published to AGGREGATES_BUCKET
+
+Published JSON is kept in memory, parsed into indexed structures: the
+timeseries of each country is a pair of arrays indexed by days since its
+first date, so a date range is a slice. Each object is fetched again with
+If-None-Match at most every REFRESH_INTERVAL seconds, and only parsed if
+its ETag changed. Responses are compact JSON, and timeseries responses
+are kept in an LRU cache, which is cleared when a timeseries changes.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from array import array
+from collections import defaultdict
+from datetime import date, timedelta
+from functools import lru_cache
+from typing import Any, Callable, Optional
+
+import boto3
+from botocore.exceptions import ClientError
+from flask import Blueprint, Response, abort, request
+
+
+LOCALSTACK_URL = os.environ.get("LOCALSTACK_URL")
+AGGREGATES_BUCKET = os.environ.get("AGGREGATES_BUCKET")
+
+REFRESH_INTERVAL = 60  # seconds
+CACHE_SIZE = 4096  # responses
+
+TIMESERIES_KEY = "timeseries/confirmed.json"
+COUNTRY_TIMESERIES_KEY = "timeseries/country_confirmed.json"
+TOTALS_KEY = "total/latest.json"
+COUNTRY_AGGREGATES_KEY = "country/latest.json"
+
+blueprint = Blueprint("query", __name__, url_prefix="/api")
+
+
+@lru_cache(maxsize=None)
+def s3_client() -> object:
+    if LOCALSTACK_URL:
+        return boto3.client("s3", endpoint_url=LOCALSTACK_URL)
+    return boto3.client("s3")
+
+
+def to_json(value: Any) -> str:
+    return json.dumps(value, separators=(",", ":"))
+
+
+class Timeseries:
+    "Daily and cumulative confirmed cases of each country, indexed by days since its first date"
+
+    def __init__(self, records: list[dict[str, Any]]):
+        rows = defaultdict(list)
+        for r in records:
+            day = date.fromisoformat(r["Date"][:10])  # published as ISO timestamps
+            rows[r.get("Country", "")].append((day, r["Cases"], r["Cumulative_cases"]))
+        self.start = {}
+        self.cases = {}
+        self.cumulative = {}
+        for country, country_rows in rows.items():
+            start = min(d for d, *_ in country_rows)
+            days = (max(d for d, *_ in country_rows) - start).days + 1
+            cases, cumulative = array("q", [0]) * days, array("q", [0]) * days
+            for d, count, total in country_rows:
+                cases[(d - start).days], cumulative[(d - start).days] = count, total
+            # days missing from the published timeseries had no cases
+            for i in range(1, days):
+                cumulative[i] = max(cumulative[i], cumulative[i - 1])
+            self.start[country], self.cases[country], self.cumulative[country] = start, cases, cumulative
+
+    def countries(self) -> list[str]:
+        return sorted(self.start)
+
+    def slice(self, country: str, start: Optional[date] = None, end: Optional[date] = None) -> list[dict[str, Any]]:
+        "Returns timeseries of country from start to end inclusive, raises KeyError for unknown countries"
+        first, cases, cumulative = self.start[country], self.cases[country], self.cumulative[country]
+        lo = 0 if start is None else max(0, (start - first).days)
+        hi = len(cases) if end is None else min(len(cases), (end - first).days + 1)
+        return [
+            {"Date": (first + timedelta(days=i)).isoformat(), "Cases": cases[i], "Cumulative_cases": cumulative[i]}
+            for i in range(lo, hi)
+        ]
+
+
+def country_aggregates(data: dict[str, list[dict[str, Any]]]) -> dict[str, Any]:
+    "Returns counts by ISO3 code, from {date: [{ISO3: counts}, ...]}"
+    [(day, countries)] = data.items()
+    return {"date": day, "countries": {k: v for c in countries for k, v in c.items()}}
+
+
+class S3Document:
+    "Parsed copy of a JSON object in S3, fetched again if its ETag changed"
+
+    def __init__(self, key: str, parse: Callable[[Any], Any] = lambda x: x,
+                 on_change: Callable[[], None] = lambda: None, bucket: Optional[str] = None,
+                 max_age: float = REFRESH_INTERVAL, client=None, missing_ok: bool = False):
+        self.key = key
+        self.parse = parse
+        self.on_change = on_change
+        self.bucket = bucket
+        self.max_age = max_age
+        self.client = client
+        self.missing_ok = missing_ok  # if so, the value of a missing object is None
+        self.lock = threading.Lock()
+        self.etag = None
+        self.value = None
+        self.checked = None
+
+    def get(self) -> Any:
+        with self.lock:
+            if self.checked is None or time.monotonic() - self.checked >= self.max_age:
+                self.refresh()
+            return self.value
+
+    def refresh(self):
+        client = self.client or s3_client()
+        conditions = {"IfNoneMatch": self.etag} if self.etag else {}
+        try:
+            response = client.get_object(Bucket=self.bucket or AGGREGATES_BUCKET, Key=self.key, **conditions)
+        except ClientError as exc:
+            code = exc.response.get("Error", {}).get("Code")
+            if self.missing_ok and code in ["NoSuchKey", "404"]:
+                logging.debug(f"{self.key} not found")
+                self.etag, self.value = None, None
+            elif code not in ["304", "NotModified"]:
+                raise
+            else:
+                logging.debug(f"{self.key} not modified")
+        else:
+            logging.info(f"Loading {self.key}, ETag {response['ETag']}")
+            self.value = self.parse(json.loads(response["Body"].read()))
+            self.etag = response["ETag"]
+            self.on_change()
+        self.checked = time.monotonic()
+
+
+def clear_caches():
+    timeseries_json.cache_clear()
+
+
+TIMESERIES = S3Document(TIMESERIES_KEY, Timeseries, clear_caches)
+COUNTRY_TIMESERIES = S3Document(COUNTRY_TIMESERIES_KEY, Timeseries, clear_caches)
+TOTALS = S3Document(TOTALS_KEY)
+COUNTRY_AGGREGATES = S3Document(COUNTRY_AGGREGATES_KEY, country_aggregates)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def timeseries_json(series: Timeseries, country: str, start: Optional[date], end: Optional[date]) -> str:
+    return to_json(series.slice(country, start, end))
+
+
+def date_arg(name: str) -> Optional[date]:
+    value = request.args.get(name)
+    try:
+        return date.fromisoformat(value) if value else None
+    except ValueError:
+        abort(400, f"{name} must be a date as YYYY-MM-DD")
+
+
+def json_response(body: str) -> Response:
+    response = Response(body, mimetype="application/json")
+    response.cache_control.public = True
+    response.cache_control.max_age = REFRESH_INTERVAL
+    return response
+
+
+@blueprint.route("/timeseries")
+def get_timeseries():
+    return get_country_timeseries(None)
+
+
+@blueprint.route("/timeseries/<country>")
+def get_country_timeseries(country: Optional[str]):
+    "Daily and cumulative confirmed cases, from ?start= to ?end= (YYYY-MM-DD) inclusive"
+    series = TIMESERIES.get() if country is None else COUNTRY_TIMESERIES.get()
+    country = country or ""
+    if country not in series.start:
+        abort(404, f"No timeseries for {country}")
+    return json_response(timeseries_json(series, country, date_arg("start"), date_arg("end")))
+
+
+@blueprint.route("/countries")
+def get_countries():
+    "Countries with a timeseries"
+    return json_response(to_json(COUNTRY_TIMESERIES.get().countries()))
+
+
+@blueprint.route("/totals")
+def get_totals():
+    return json_response(to_json(TOTALS.get()))
+
+
+@blueprint.route("/aggregates")
+def get_country_aggregates():
+    "Latest confirmed and suspected cases by ISO3 code"
+    return json_response(to_json(COUNTRY_AGGREGATES.get()))
+
+
+@blueprint.route("/aggregates/<iso3>")
+def get_country_aggregate(iso3: str):
+    aggregates = COUNTRY_AGGREGATES.get()
+    if iso3 not in aggregates["countries"]:
+        abort(404, f"No aggregates for {iso3}")
+    return json_response(to_json({"date": aggregates["date"], iso3: aggregates["countries"][iso3]}))
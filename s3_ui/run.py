@@ -1,11 +1,20 @@
+import hashlib
 import logging
+import math
 import os
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Optional
 
 import boto3
-from flask import Flask, render_template, redirect
+from botocore.config import Config
+from flask import Flask, Response, abort, make_response, render_template, redirect, request
 import serverless_wsgi
+from werkzeug.exceptions import HTTPException
 
 from logger import setup_logger
+import query
 
 
 LOCALSTACK_URL = os.environ.get("LOCALSTACK_URL")
@@ -15,12 +24,37 @@ ARCHIVES = "archives"
 CASE_DEFINITIONS = "case-definitions"
 ECDC = "ecdc"
 ECDC_ARCHIVES = "ecdc-archives"
+FOLDERS = [ARCHIVES, CASE_DEFINITIONS, ECDC, ECDC_ARCHIVES]
+
+MANIFEST_NAME = ".index.json"  # kept up to date by the ingestion job, see src/bucket_index.py
+MAX_POOL_CONNECTIONS = 10
+LISTING_TTL = 60  # seconds a folder listing is reused
+# folders are listed instead if the ingestion job has not listed them for
+# this long, as objects it did not store are only in the manifest once listed
+MANIFEST_MAX_AGE = timedelta(days=2)
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+SORT_KEYS = {
+    "name": lambda o: o["name"],
+    "date": lambda o: o["last_modified"],
+    "size": lambda o: o["size"],
+}
+
+# links to files of folder pages are presigned URLs valid for EMBEDDED_URL_EXPIRY
+# seconds, unless disabled, then /url/<folder>/<file_name> redirects to a new one
+EMBED_URLS = os.environ.get("EMBED_URLS", "true").lower() == "true"
+EMBEDDED_URL_EXPIRY = int(os.environ.get("EMBEDDED_URL_EXPIRY", 3600))
+REDIRECT_URL_EXPIRY = 60
+MAX_URL_EXPIRY = 7 * 24 * 3600  # longest expiry of SigV4 presigned URLs
+if not 2 <= EMBEDDED_URL_EXPIRY <= MAX_URL_EXPIRY:
+    raise ValueError(f"EMBEDDED_URL_EXPIRY must be from 2 to {MAX_URL_EXPIRY} seconds, not {EMBEDDED_URL_EXPIRY}")
 
 FLASK_HOST = os.environ.get("FLASK_HOST", "0.0.0.0")
 FLASK_PORT = os.environ.get("FLASK_PORT", 5000)
 FLASK_DEBUG = os.environ.get("FLASK_DEBUG", False)
 
 app = Flask(__name__)
+app.register_blueprint(query.blueprint)
 setup_logger()
 
 
@@ -32,63 +66,166 @@ def home():
 @app.route(f"/{ARCHIVES}")
 def get_archive_files():
     try:
-        files = [f.split("/")[1] for f in list_bucket_contents(ARCHIVES)]
-        logging.debug(f"Files in {ARCHIVES} folder: {files}")
-        return render_template("folder.html", folder=ARCHIVES, files=files)
+        return render_folder(ARCHIVES)
+    except HTTPException:
+        raise  # e.g. 400 for bad query parameters, or 304
     except Exception as exc:
         return f"Exception: {exc}"
 
 
 @app.route(f"/{CASE_DEFINITIONS}")
 def get_case_definition_files():
-    files = [f.split("/")[1] for f in list_bucket_contents(CASE_DEFINITIONS)]
-    logging.debug(f"Files in {CASE_DEFINITIONS} folder: {files}")
-    return render_template("folder.html", folder=CASE_DEFINITIONS, files=files)
+    return render_folder(CASE_DEFINITIONS)
 
 
 @app.route(f"/{ECDC}")
 def get_ecdc_files():
-    files = [f.split("/")[1] for f in list_bucket_contents(ECDC)]
-    logging.debug(f"Files in {ECDC} folder: {files}")
-    return render_template("folder.html", folder=ECDC, files=files)
+    return render_folder(ECDC)
 
 
 @app.route(f"/{ECDC_ARCHIVES}")
 def get_ecdc_archive_files():
-    files = [f.split("/")[1] for f in list_bucket_contents(ECDC_ARCHIVES)]
-    logging.debug(f"Files in {ECDC_ARCHIVES} folder: {files}")
-    return render_template("folder.html", folder=ECDC_ARCHIVES, files=files)
+    return render_folder(ECDC_ARCHIVES)
 
 
-def list_bucket_contents(folder: str) -> list[str]:
+def date_arg(name: str) -> Optional[date]:
+    value = request.args.get(name)
+    try:
+        return date.fromisoformat(value) if value else None
+    except ValueError:
+        abort(400, f"{name} must be a date as YYYY-MM-DD")
+
+
+def render_folder(folder: str):
+    """Renders a page of files in folder, modified from ?since= to ?until=
+    (YYYY-MM-DD) inclusive, sorted by ?sort= (name, date or size) and ?order=
+
+    Pages have an ETag of the version of the folder's contents and the query,
+    and are not rendered again for a request with a matching If-None-Match."""
+    version, objects = folder_contents(folder)
+    # pages with embedded URLs change every half of their expiry, so that
+    # a page revalidated with If-None-Match never has expired links
+    window = int(time.time() // max(EMBEDDED_URL_EXPIRY // 2, 1)) if EMBED_URLS else None
+    etag = hashlib.sha1(f"{version} {window} {sorted(request.args.items(multi=True))}".encode()).hexdigest()
+    if etag in request.if_none_match:
+        logging.debug(f"Page of {folder} folder not modified")
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+
+    sort = request.args.get("sort", "name")
+    if sort not in SORT_KEYS:
+        abort(400, f"sort must be one of {list(SORT_KEYS)}")
+    descending = request.args.get("order", "asc") == "desc"
+    since, until = date_arg("since"), date_arg("until")
+    per_page = min(max(request.args.get("per_page", PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+
+    objects = [
+        o for o in objects
+        if (since is None or o["last_modified"].date() >= since)
+        and (until is None or o["last_modified"].date() <= until)
+    ]
+    objects.sort(key=SORT_KEYS[sort], reverse=descending)
+    pages = max(math.ceil(len(objects) / per_page), 1)
+    page = min(max(request.args.get("page", 1, type=int), 1), pages)
+    files = objects[(page - 1) * per_page:page * per_page]
+    if EMBED_URLS:
+        urls = presigned_urls(folder, {f["name"]: f.get("key", f["name"]) for f in files}, EMBEDDED_URL_EXPIRY)
+        files = [{**f, "url": urls[f["name"]]} for f in files]
+    logging.debug(f"Page {page} of {pages} of {folder} folder: {[f['name'] for f in files]}")
+    args = {k: v for k, v in request.args.items() if k != "page"}
+    response = make_response(render_template("folder.html", folder=folder, files=files, count=len(objects),
+                                             page=page, pages=pages, args=args))
+    response.set_etag(etag)
+    response.cache_control.no_cache = True  # revalidated with If-None-Match on every view
+    return response
+
+
+def folder_contents(folder: str) -> tuple[str, list[dict[str, Any]]]:
+    """Returns version and files of folder, read from the manifest kept by
+    the ingestion job, or listed if there is none or it is stale"""
+    with LISTINGS_LOCK:
+        if folder not in MANIFESTS:
+            MANIFESTS[folder] = query.S3Document(f"{folder}/{MANIFEST_NAME}", manifest_files, bucket=S3_BUCKET,
+                                                 max_age=LISTING_TTL, client=S3_CLIENT, missing_ok=True)
+        manifest = MANIFESTS[folder]
+    contents = manifest.get()
+    if contents is not None and contents[0] >= datetime.now(timezone.utc) - MANIFEST_MAX_AGE:
+        return manifest.etag, contents[1]
+    logging.debug(f"No recent manifest of {folder} folder, listing it")
+    _, version, files = list_folder(folder)
+    return version, files
+
+
+def manifest_files(manifest: Any) -> Optional[tuple[datetime, list[dict[str, Any]]]]:
+    "Returns time the folder was last listed and files of manifest"
+    if not isinstance(manifest, dict) or "listed" not in manifest:
+        return None  # from before manifests had sizes and dates, or listing times
+    files = [{**f, "last_modified": datetime.fromisoformat(f["last_modified"])} for f in manifest["files"]]
+    return datetime.fromisoformat(manifest["listed"]), files
+
+
+def list_folder(folder: str) -> tuple[float, str, list[dict[str, Any]]]:
+    """Returns time listed, version (a hash of the listing), and name, size
+    and last_modified of each file directly in folder, listing it at most
+    every LISTING_TTL seconds"""
+    with LISTINGS_LOCK:
+        listed = LISTINGS.get(folder)
+    if listed and time.monotonic() - listed[0] < LISTING_TTL:
+        return listed
     logging.debug(f"Listing bucket contents for folder {folder}")
-    client = create_s3_client()
-    response = client.list_objects(Bucket=S3_BUCKET,
-                                 Prefix=f"{folder}/",
-                                 Delimiter="/"
-                                )
-    contents = []
-    for obj in response.get("Contents", []):
-        contents.append(obj.get("Key"))
+    start = time.monotonic()
+    objects = []
+    paginator = S3_CLIENT.get_paginator("list_objects_v2")
+    for response in paginator.paginate(Bucket=S3_BUCKET, Prefix=f"{folder}/", Delimiter="/"):
+        for obj in response.get("Contents", []):
+            name = obj["Key"][len(folder) + 1:]
+            # manifests kept by the ingestion job are hidden
+            if name and not name.startswith("."):
+                objects.append({"name": name, "size": obj["Size"], "last_modified": obj["LastModified"]})
+    logging.debug(f"Listed {len(objects)} objects for prefix {folder} in {time.monotonic() - start:.2f}s")
+    listed = (start, hashlib.sha1(repr(objects).encode()).hexdigest(), objects)
+    with LISTINGS_LOCK:
+        LISTINGS[folder] = listed
+    return listed
 
-    logging.debug(f"Listed objects for prefix {folder}: {contents}")
-    return contents
+
+def list_bucket_contents(folder: str) -> list[str]:
+    return [f"{folder}/{o['name']}" for o in list_folder(folder)[2]]
 
 
 @app.route("/url/<folder>/<file_name>")
 def get_presigned_url(folder, file_name):
     logging.debug(f"Creating presigned URL for {folder}/{file_name}")
-    client = create_s3_client()
-    params = {"Bucket": S3_BUCKET, "Key": f"{folder}/{file_name}"}
-    return redirect(client.generate_presigned_url("get_object", Params=params, ExpiresIn=60))
+    # files stored once for several names are listed with the key of their object
+    keys = {f["name"]: f["key"] for f in folder_contents(folder)[1] if "key" in f} if folder in FOLDERS else {}
+    return redirect(presigned_urls(folder, {file_name: keys.get(file_name, file_name)}, REDIRECT_URL_EXPIRY)[file_name])
+
+
+def presigned_urls(folder: str, keys: dict[str, str], expiry: int) -> dict[str, str]:
+    "Returns presigned URLs of files in folder (name -> key in folder), signed locally with the shared client"
+    return {
+        name: S3_CLIENT.generate_presigned_url(
+            "get_object", Params={"Bucket": S3_BUCKET, "Key": f"{folder}/{key}"}, ExpiresIn=expiry
+        )
+        for name, key in keys.items()
+    }
 
 
 def create_s3_client() -> object:
+    config = Config(max_pool_connections=MAX_POOL_CONNECTIONS)
     if LOCALSTACK_URL:
         logging.debug(f"Creating an S3 client using Localstack at {LOCALSTACK_URL}")
-        return boto3.client("s3", endpoint_url=LOCALSTACK_URL)
+        return boto3.client("s3", endpoint_url=LOCALSTACK_URL, config=config)
     logging.debug("Creating an S3 client using AWS")
-    return boto3.client("s3")
+    return boto3.client("s3", config=config)
+
+
+# created once per process, and reused by warm Lambda invocations
+S3_CLIENT = create_s3_client()
+LISTINGS: dict[str, tuple[float, str, list[dict[str, Any]]]] = {}  # folder -> (time listed, version, objects)
+MANIFESTS: dict[str, query.S3Document] = {}  # by folder
+LISTINGS_LOCK = threading.Lock()
 
 
 def handler(event, context):
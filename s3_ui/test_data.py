@@ -78,3 +78,25 @@ def test_files_downloadable(client, folder):
 		pytest.fail("The endpoint should return a presigned URL")
 
 	assert redirect == presigned, f"URLs do not match: expected {redirect}, got {presigned}"
+
+
+def test_folders_paginated(client):
+	response = client.get(f"/{ARCHIVES}?per_page=4&page=2&sort=size&order=desc")
+	assert "6 files, page 2 of 2" in response.text
+	assert response.text.count("</a>") == 2 + 2  # files, previous page and home
+	assert client.get(f"/{ARCHIVES}?since=2000-01-01&until=2000-01-02").text.count("</a>") == 1
+	assert client.get(f"/{CASE_DEFINITIONS}?sort=colour").status_code == 400
+	assert client.get(f"/{ARCHIVES}?sort=colour").status_code == 400
+
+
+def test_folder_not_modified(client):
+	response = client.get(f"/{ECDC}")
+	assert response.status_code == 200 and response.headers["ETag"]
+	response = client.get(f"/{ECDC}", headers={"If-None-Match": response.headers["ETag"]})
+	assert response.status_code == 304 and not response.data
+
+
+def test_folder_links_presigned(client):
+	response = client.get(f"/{ECDC}")
+	links = re.findall(r"href=\"([^\"]+)\">[^<]+\.csv</a>", response.text)
+	assert links and all(f"/{ECDC}/" in link and "Signature" in link for link in links)
@@ -0,0 +1,84 @@
+import io
+import json
+
+from botocore.exceptions import ClientError
+from flask import Flask
+import pytest
+
+import query
+
+
+COUNTRY_TIMESERIES = [
+	{"Date": "2022-05-06T00:00:00.000", "Cases": 1, "Cumulative_cases": 1, "Country": "United Kingdom"},
+	{"Date": "2022-05-07T00:00:00.000", "Cases": 0, "Cumulative_cases": 1, "Country": "United Kingdom"},
+	{"Date": "2022-05-08T00:00:00.000", "Cases": 2, "Cumulative_cases": 3, "Country": "United Kingdom"},
+	{"Date": "2022-05-07T00:00:00.000", "Cases": 4, "Cumulative_cases": 4, "Country": "Spain"},
+	{"Date": "2022-05-09T00:00:00.000", "Cases": 1, "Cumulative_cases": 5, "Country": "Spain"},
+]
+
+
+class FakeClient:
+	def __init__(self, objects):
+		self.objects = objects
+		self.gets = 0
+
+	def get_object(self, Bucket, Key, IfNoneMatch=None):
+		self.gets += 1
+		etag = f'"{hash(self.objects[Key])}"'
+		if IfNoneMatch == etag:
+			raise ClientError({"Error": {"Code": "304"}}, "GetObject")
+		return {"Body": io.BytesIO(self.objects[Key].encode()), "ETag": etag}
+
+
+@pytest.fixture()
+def s3(monkeypatch):
+	client = FakeClient({
+		query.COUNTRY_TIMESERIES_KEY: json.dumps(COUNTRY_TIMESERIES),
+		query.COUNTRY_AGGREGATES_KEY: json.dumps({"2022-05-09": [{"GBR": {"confirmed": 3, "suspected": 0}}]}),
+	})
+	monkeypatch.setattr(query, "COUNTRY_TIMESERIES", query.S3Document(
+		query.COUNTRY_TIMESERIES_KEY, query.Timeseries, query.clear_caches, "bucket", 0, client))
+	monkeypatch.setattr(query, "COUNTRY_AGGREGATES", query.S3Document(
+		query.COUNTRY_AGGREGATES_KEY, query.country_aggregates, bucket="bucket", client=client))
+	yield client
+
+
+@pytest.fixture()
+def client(s3):
+	app = Flask(__name__)
+	app.register_blueprint(query.blueprint)
+	with app.test_client() as client:
+		yield client
+
+
+def test_timeseries_slice():
+	series = query.Timeseries(COUNTRY_TIMESERIES)
+	assert series.countries() == ["Spain", "United Kingdom"]
+	assert series.slice("Spain") == [
+		{"Date": "2022-05-07", "Cases": 4, "Cumulative_cases": 4},
+		{"Date": "2022-05-08", "Cases": 0, "Cumulative_cases": 4},
+		{"Date": "2022-05-09", "Cases": 1, "Cumulative_cases": 5},
+	]
+
+
+def test_country_timeseries(client):
+	response = client.get("/api/timeseries/United Kingdom?start=2022-05-07&end=2022-05-30")
+	assert response.status_code == 200
+	assert response.text == '[{"Date":"2022-05-07","Cases":0,"Cumulative_cases":1},' \
+		'{"Date":"2022-05-08","Cases":2,"Cumulative_cases":3}]'
+	assert client.get("/api/timeseries/Atlantis").status_code == 404
+	assert client.get("/api/timeseries/Spain?start=May").status_code == 400
+
+
+def test_documents_reloaded_when_etag_changes(client, s3):
+	assert client.get("/api/timeseries/Spain?end=2022-05-07").json == [
+		{"Date": "2022-05-07", "Cases": 4, "Cumulative_cases": 4}]
+	s3.objects[query.COUNTRY_TIMESERIES_KEY] = json.dumps(
+		[{**r, "Cases": r["Cases"] + 1} for r in COUNTRY_TIMESERIES])
+	assert client.get("/api/timeseries/Spain?end=2022-05-07").json[0]["Cases"] == 5
+
+
+def test_country_aggregates(client, s3):
+	assert client.get("/api/aggregates/GBR").json == {"date": "2022-05-09", "GBR": {"confirmed": 3, "suspected": 0}}
+	assert client.get("/api/aggregates/ESP").status_code == 404
+	assert s3.gets == 1
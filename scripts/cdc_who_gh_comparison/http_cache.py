@@ -0,0 +1,126 @@
+"""
+Shared HTTP client with a persistent cache of upstream responses
+
+Copy of src/http_cache.py, as scripts are built from their own folder
+
+Requests share one connection pooled session, with the same timeout and
+retries. Responses with an ETag or Last-Modified header are stored in
+CACHE_DIR, and those headers are sent back as If-None-Match and
+If-Modified-Since on the next request: a 304 response is answered from
+the cache, and marked not_modified so callers can skip parsing it again.
+Callers which skip work on not_modified request with commit=False, and
+call commit() once they have handled the response, so a response which
+could not be handled (e.g. stored) is fetched again on the next request.
+"""
+
+import os
+import json
+import hashlib
+import logging
+import tempfile
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+CACHE_DIR = Path(os.environ.get("HTTP_CACHE_DIR", ".http-cache"))
+TIMEOUT = 60  # seconds
+POOL_SIZE = 16
+RETRIES = Retry(
+    total=3,
+    backoff_factor=1,
+    status_forcelist=[429, 500, 502, 503, 504],
+    allowed_methods=None,  # the POST APIs used here only query data
+)
+VALIDATORS = {"ETag": "If-None-Match", "Last-Modified": "If-Modified-Since"}
+
+SESSION = requests.Session()
+SESSION.mount("http://", HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=RETRIES))
+SESSION.mount("https://", HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=RETRIES))
+
+
+@dataclass
+class Response:
+    url: str
+    status_code: int  # of the upstream response, 304 if served from cache
+    content: bytes
+    headers: dict[str, str] = field(default_factory=dict)
+    cache_key: Optional[str] = field(default=None, repr=False)  # set if not yet in the cache
+
+    @property
+    def not_modified(self) -> bool:
+        return self.status_code == 304
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8")
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+    def commit(self):
+        "Stores response in the cache, so the next request is conditional on its validators"
+        if self.cache_key is not None:
+            write_cache(self.cache_key, self.headers, self.content)
+            self.cache_key = None
+
+
+def cache_key(method: str, url: str, body: Optional[Any] = None) -> str:
+    return hashlib.sha256(json.dumps([method, url, body]).encode("utf-8")).hexdigest()
+
+
+def read_cache(key: str) -> Optional[tuple[dict[str, str], bytes]]:
+    "Returns cached headers and body, if any"
+    try:
+        headers = json.loads((CACHE_DIR / f"{key}.json").read_text())
+        return headers, (CACHE_DIR / f"{key}.body").read_bytes()
+    except (OSError, ValueError):
+        return None
+
+
+def write_file(path: Path, data: bytes):
+    "Writes data to path atomically, so concurrent runs never read partial files"
+    with tempfile.NamedTemporaryFile(dir=path.parent, delete=False) as fp:
+        fp.write(data)
+    os.replace(fp.name, path)
+
+
+def write_cache(key: str, headers: dict[str, str], content: bytes):
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        write_file(CACHE_DIR / f"{key}.body", content)
+        write_file(CACHE_DIR / f"{key}.json", json.dumps(headers).encode("utf-8"))
+    except OSError:
+        logging.exception(f"Could not write HTTP cache to {CACHE_DIR}")
+
+
+def request(method: str, url: str, json_body: Optional[Any] = None, timeout: float = TIMEOUT,
+            commit: bool = True) -> Response:
+    """Sends request, conditional on validators of a cached response, and
+    raises for error statuses. The response is only cached once committed,
+    by default straight away."""
+    key = cache_key(method, url, json_body)
+    cached = read_cache(key)
+    headers = {VALIDATORS[h]: v for h, v in cached[0].items() if h in VALIDATORS} if cached else {}
+    r = SESSION.request(method, url, json=json_body, headers=headers, timeout=timeout)
+    if r.status_code == 304 and cached:
+        logging.info(f"{method} {url}: not modified, using cached response")
+        return Response(url, 304, cached[1], cached[0])
+    r.raise_for_status()
+    validators = {h: r.headers[h] for h in VALIDATORS if h in r.headers}
+    logging.info(f"{method} {url}: {r.status_code}, {len(r.content)} bytes{'' if validators else ', not cacheable'}")
+    response = Response(url, r.status_code, r.content, validators, key if validators else None)
+    if commit:
+        response.commit()
+    return response
+
+
+def get(url: str, timeout: float = TIMEOUT, commit: bool = True) -> Response:
+    return request("GET", url, timeout=timeout, commit=commit)
+
+
+def post(url: str, json_body: Optional[Any] = None, timeout: float = TIMEOUT, commit: bool = True) -> Response:
+    return request("POST", url, json_body, timeout, commit)
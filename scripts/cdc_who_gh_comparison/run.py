@@ -1,18 +1,21 @@
-import codecs
 from contextlib import closing
 import csv
 from datetime import date
+from functools import cache
 import io
 import json
 import logging
 import os
 import sys
 from time import sleep
+from typing import Optional
 
 import click
 import pygsheets
 import requests
 
+import http_cache
+
 
 DOCUMENT_ID = os.environ.get("DOCUMENT_ID")
 
@@ -64,10 +67,19 @@ def setup_logger():
 	rootLogger.setLevel(logging.INFO)
 
 
+@cache
+def get_client() -> pygsheets.client.Client:
+	return pygsheets.authorize(service_account_env_var="GOOGLE_CREDENTIALS")
+
+
+@cache
+def get_spreadsheet() -> pygsheets.Spreadsheet:
+	return get_client().open_by_key(DOCUMENT_ID)
+
+
 def get_gh_data(worksheet_title: str, as_lists=True) -> list[dict[str, str|int|None]]:
 	logging.info("Getting data from Google Sheets")
-	client = pygsheets.authorize(service_account_env_var="GOOGLE_CREDENTIALS")
-	spreadsheet = client.open_by_key(DOCUMENT_ID)
+	spreadsheet = get_spreadsheet()
 
 	try:
 		if as_lists:
@@ -100,8 +112,8 @@ def convert_lists(data: list[list]) -> list[dict]:
 def get_cdc_data() -> list[dict[str, str|int|None]]:
 	logging.info("Getting CDC data")
 	try:
-		response = requests.get(CDC_ENDPOINT)
-		reader = csv.DictReader(codecs.iterdecode(response.iter_lines(), "utf-8"))
+		response = http_cache.get(CDC_ENDPOINT)
+		reader = csv.DictReader(io.StringIO(response.text))
 		return [row for row in reader]
 	except Exception:
 		logging.exception("Something went wrong when trying to retrieve CDC data")
@@ -110,7 +122,7 @@ def get_cdc_data() -> list[dict[str, str|int|None]]:
 def get_who_data() -> list[dict[str, str|int|None]]:
 	logging.info("Getting WHO data")
 	try:
-		response = requests.post(WHO_ENDPOINT, json={})
+		response = http_cache.post(WHO_ENDPOINT, json_body={})
 		return response.json().get("Data")
 	except Exception:
 		logging.exception("Something went wrong when trying to retrieve WHO data")
@@ -135,10 +147,10 @@ def format_who_data(data: list[dict[str, str|int|None]]) -> dict[str, int]:
 			continue
 		if name in ["USA", "UNITED KINGDOM"]:
 			continue
-		for who_name, gh_name in WHO_TO_GH.items():
-			if name.title() == who_name:
-				clean_data[gh_name] = entry["CasesAll"]
-		clean_data[name.title()] = entry["CasesAll"]
+		name = name.title()
+		if gh_name := WHO_TO_GH.get(name):
+			clean_data[gh_name] = entry["CasesAll"]
+		clean_data[name] = entry["CasesAll"]
 	return clean_data
 
 
@@ -197,11 +209,14 @@ def compare_who_data(gh_data: dict[str, int], who_data: dict[str, int]) -> dict[
 	return diffs
 
 
-def change_gh_data(changes: dict[str, int], dry_run: bool) -> None:
+def change_gh_data(changes: dict[str, int], dry_run: bool,
+	records: Optional[list[dict[str, str|int|None]]] = None) -> None:
+	"""Appends or omits cases of each state, records are rows of the line
+	list if they have already been read"""
 	logging.info("Changing G.h USA data")
-	client = pygsheets.authorize(service_account_env_var="GOOGLE_CREDENTIALS")
+	client = get_client()
 	client.set_batch_mode(True)
-	spreadsheet = client.open_by_key(DOCUMENT_ID)
+	spreadsheet = get_spreadsheet()
 
 	sheet = spreadsheet.worksheet("title", LINE_LIST_SHEET)
 
@@ -214,7 +229,8 @@ def change_gh_data(changes: dict[str, int], dry_run: bool) -> None:
 
 	columns = sheet.get_row(1)
 	today = date.today().strftime("%Y-%m-%d")
-	records = sheet.get_all_records()
+	if records is None:
+		records = sheet.get_all_records()
 	row = len(records)
 
 	for state, count in changes.items():
@@ -328,7 +344,7 @@ def run(cdc, who, slack, dry):
 		fmt_cdc_data = format_cdc_data(cdc_data)
 		fmt_gh_data = format_gh_usa_data(gh_data)
 		diff = compare_cdc_data(fmt_gh_data, fmt_cdc_data)
-		change_gh_data(diff, dry)
+		change_gh_data(diff, dry, gh_data)
 	elif who and not cdc:
 		logging.info("Retrieving and comparing WHO and G.h global data")
 		gh_data = get_gh_data(COUNTRY_COUNT_SHEET, as_lists=True)
@@ -9,7 +9,8 @@ import logging
 
 import boto3
 import pandas as pd
-import pycountry
+
+from countries import CountryResolver
 
 s3 = boto3.resource("s3")
 
@@ -22,6 +23,8 @@ COUNTRY_ISO3_QUIRKS = {
     "russia": "RUS",
 }
 
+COUNTRY_RESOLVER = CountryResolver(COUNTRY_ISO3_QUIRKS, fuzzy=False)
+
 
 def require_env(vars: list[str]):
     "Returns required environment variables in a dictionary or aborts"
@@ -40,6 +43,27 @@ def read_key_content(bucket: str, key: str) -> str:
         raise
 
 
+def cumulative_counts(
+    df: pd.DataFrame, dimensions: list[str], last_date: pd.Timestamp = None
+) -> pd.DataFrame:
+    """Returns timeseries of counts and cumulative counts of rows in df by
+    dimensions, using the Date column (same as src/timeseries.py)"""
+
+    counts = df.groupby(dimensions + ["Date"]).size().unstack("Date", fill_value=0)
+    counts = counts.reindex(
+        columns=pd.date_range(counts.columns.min(), last_date, name="Date"),
+        fill_value=0,
+    )
+    cumulative = counts.cumsum(axis=1)
+    timeseries = pd.DataFrame(
+        {"Cases": counts.stack(), "Cumulative_cases": cumulative.stack()}
+    )
+    return (
+        timeseries[cumulative.stack() > 0]
+        .reset_index()[["Date", "Cases", "Cumulative_cases", *dimensions]]
+    )
+
+
 def timeseries_by_country_confirmed(
     df: pd.DataFrame, last_date: pd.Timestamp = None
 ) -> pd.DataFrame:
@@ -50,26 +74,13 @@ def timeseries_by_country_confirmed(
         Date=pd.to_datetime(confirmed.Date_confirmation),
         Country=confirmed.Country.replace(UK_COUNTRIES, "United Kingdom"),
     )
-    dfs = []
-    for country, country_df in confirmed.groupby("Country"):
-        country_counts = country_df.groupby("Date").size().resample("D").sum()
-        country_counts = country_counts.reindex(
-            pd.date_range(country_counts.index.min(), last_date),
-            fill_value=0,
-        )
-        dfs.append(
-            pd.DataFrame([country_counts, country_counts.cumsum()])
-            .T.reset_index()
-            .rename(
-                columns={
-                    0: "GH_confirmed_cases",
-                    1: "GH_cumulative_confirmed_cases",
-                    "index": "Date",
-                }
-            )
-            .assign(GH_country=country)
-        )
-    df = pd.concat(dfs).reset_index().drop("index", axis=1)
+    df = cumulative_counts(confirmed, ["Country"], last_date).rename(
+        columns={
+            "Cases": "GH_confirmed_cases",
+            "Cumulative_cases": "GH_cumulative_confirmed_cases",
+            "Country": "GH_country",
+        }
+    )
     df["ISO3"] = df.GH_country.map(get_country_iso3)
     return df
 
@@ -93,14 +104,9 @@ def who_df(who_data: dict) -> pd.DataFrame:
 
 
 def get_country_iso3(country: str) -> str:
-    country = country.lower()
-    if country in COUNTRY_ISO3_QUIRKS:
-        return COUNTRY_ISO3_QUIRKS[country]
-    got_country = pycountry.countries.lookup(country)
-    if not got_country:
+    if not (iso3 := COUNTRY_RESOLVER(country)):
         raise ValueError(f"Could not find country: {country}")
-    else:
-        return got_country.alpha_3
+    return iso3
 
 
 def merge_data(gh: pd.DataFrame, who: pd.DataFrame) -> pd.DataFrame:
@@ -0,0 +1,97 @@
+"""
+Counts of cases by country, status, gender, age band, outcome and date
+
+The typed line list (see schema.to_dataframe()) is grouped once by all
+DIMENSIONS, giving a cube of counts with a row per combination of values
+that occurs, including missing values. Counts by any subset of dimensions
+are sums over the cube, which is much smaller than the line list, so
+totals and counts by each dimension do not scan the cases again.
+
+Age is a range (m-n, <n, >n or n), and is counted in the band of AGE_BANDS
+which contains the whole range, or as missing if it spans several bands.
+"""
+
+import io
+import json
+from typing import Any
+
+import numpy as np
+import pandas as pd
+
+AGE_BANDS = [0, 10, 20, 30, 40, 50, 60, 70, 80]  # lower bounds, the last band is open
+DIMENSIONS = ["Country", "Country_ISO3", "Status", "Gender", "Age_band", "Outcome", "Date_confirmation"]
+EXCLUDED_STATUSES = ["discarded", "omit_error"]  # not in totals, only in counts by Status
+
+AGE_RANGE = r"^\s*(?P<bound>[<>]?)\s*(?P<low>\d+)\s*(?:-\s*(?P<high>\d+))?\s*$"
+
+
+def age_band_label(i: int) -> str:
+    if i == len(AGE_BANDS) - 1:
+        return f"{AGE_BANDS[i]}+"
+    return f"{AGE_BANDS[i]}-{AGE_BANDS[i + 1] - 1}"
+
+
+def age_band(age: pd.Series) -> pd.Series:
+    "Returns band of AGE_BANDS containing each age range, missing if none does"
+    parts = age.astype("string").str.extract(AGE_RANGE)
+    below, above = parts["bound"].eq("<"), parts["bound"].eq(">")
+    n = pd.to_numeric(parts["low"], errors="coerce")
+    low = n.mask(below, 0).mask(above, n + 1)
+    high = pd.to_numeric(parts["high"], errors="coerce").fillna(n).mask(below, n - 1).mask(above, np.inf)
+    high = high.mask(parts["bound"].ne("") & parts["high"].notna())  # <m-n and >m-n are not ranges
+    band_low, band_high = (np.searchsorted(AGE_BANDS[1:], bound, side="right") for bound in (low, high))
+    valid = low.notna() & high.notna() & (low <= high) & (band_low == band_high)
+    labels = [age_band_label(i) for i in range(len(AGE_BANDS))]
+    return pd.Series(pd.Categorical.from_codes(np.where(valid, band_low, -1), categories=labels), index=age.index)
+
+
+def cube(df: pd.DataFrame) -> pd.DataFrame:
+    "Returns counts of cases by DIMENSIONS, with a count column"
+    dimensions = df.assign(Age_band=age_band(df.Age))[DIMENSIONS]
+    # as strings, since groupby() drops missing values of categoricals with pandas < 2
+    dimensions = dimensions.astype({d: "string" for d in DIMENSIONS if d != "Date_confirmation"})
+    return dimensions.groupby(DIMENSIONS, dropna=False, sort=False).size().rename("count").reset_index()
+
+
+def json_value(value: Any) -> Any:
+    if pd.isna(value):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.strftime("%Y-%m-%d")
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def counts_by(cube_df: pd.DataFrame, dimension: str) -> dict[str, int]:
+    "Returns counts by values of dimension, missing values counted under an empty key"
+    counts = cube_df.groupby(cube_df[dimension].map(json_value).fillna(""), sort=True)["count"].sum()
+    return {str(k): int(v) for k, v in counts.items()}
+
+
+def summary(cube_df: pd.DataFrame) -> dict[str, Any]:
+    """Returns total and counts by each dimension, excluding cases with
+    EXCLUDED_STATUSES except in the counts by Status"""
+    included = cube_df[~cube_df.Status.isin(EXCLUDED_STATUSES)]
+    return {
+        "total": int(included["count"].sum()),
+        "by": {
+            dimension: counts_by(cube_df if dimension == "Status" else included, dimension)
+            for dimension in DIMENSIONS
+        },
+    }
+
+
+def to_json(cube_df: pd.DataFrame) -> str:
+    "Returns cube as a list of records, with dates as YYYY-MM-DD and missing values as null"
+    return json.dumps([
+        {k: json_value(v) for k, v in row.items()}
+        for row in cube_df.to_dict(orient="records")
+    ])
+
+
+def to_parquet(cube_df: pd.DataFrame) -> bytes:
+    "Returns cube as Parquet, requires pyarrow"
+    df = cube_df.copy()
+    df["Date_confirmation"] = df.Date_confirmation.dt.date
+    buf = io.BytesIO()
+    df.to_parquet(buf, index=False)
+    return buf.getvalue()
@@ -1,30 +1,40 @@
-from collections.abc import Iterable
+from collections.abc import Iterable, Mapping
 from datetime import date, datetime
+import gzip
 import json
 import logging
 import os
 import io
 import sys
 import csv
+import shutil
 from urllib.parse import urlparse
-from collections import defaultdict
 from pathlib import Path
-from typing import Any, Optional
+from typing import IO, Any, Optional
 import concurrent
-from itertools import repeat
+from itertools import chain, repeat
 
 import boto3
 import yaml
-import pdfkit
-import pygsheets
-import pycountry
-import requests
 import pandas as pd
 import click
 
+import aggregates
+import archiver
+import dataset
+import http_cache
 import qc
+import sheets
+import sheets_sync
+import schema
+import snapshots
 import timeseries
-from ecdc import get_ecdc_data, TARGET_DIVS
+import upload
+from bucket_index import BucketIndex, HashingSpool
+from countries import CountryResolver
+from records import Record, RecordFactory
+from document_store import DocumentStore
+from ecdc import get_all_ecdc_data, TARGET_DIVS, URL as ECDC_URL
 
 
 Data = list[dict[str, Any]]
@@ -36,15 +46,25 @@ FIELDS: list[str] = []
 with open("data_dictionary.yml") as fp:
     data_dictionary = yaml.safe_load(fp)
     FIELDS = [f["name"] for f in data_dictionary["fields"]]
+    FIELD_SET = set(FIELDS)
 
 
 S3 = boto3.resource("s3")
 
+SPOOL_SIZE = 64 * 1024 * 1024  # bytes of each formatted file kept in memory
+CLEAN_CHUNK_SIZE = 20000  # cases
+
+LINE_LIST_WORKSHEET = "Confirmed/Suspected"
+ENDEMIC_WORKSHEET = "Endemic Countries"
+
 DATA_FOLDER = "archives"
 SOURCES_FOLDER = "sources"
 CASE_DEFINITIONS_FOLDER = "case-definitions"
+ECDC_FOLDER = "ecdc"
+ECDC_ARCHIVES_FOLDER = "ecdc-archives"
 
-BUCKET_CONTENTS: list[str] = []
+BUCKET_INDEXES: dict[str, BucketIndex] = {}  # by folder
+DOCUMENT_STORES: dict[str, DocumentStore] = {}  # by folder
 
 ISO3_QUIRKS = {
     "england": "GBR",
@@ -58,23 +78,32 @@ ISO3_QUIRKS = {
     "republic of congo": "COG",
 }
 
+COUNTRY_RESOLVER = CountryResolver(ISO3_QUIRKS)
+
+# Content-Type of additional archive formats; compressed archives are files
+# of their own type, without Content-Encoding, so clients do not decompress
+# them on download
+ARCHIVE_FORMATS = {
+    "csv.gz": {"ContentType": "application/gzip"},
+    "json.gz": {"ContentType": "application/gzip"},
+    "csv.zst": {"ContentType": "application/zstd"},
+    "json.zst": {"ContentType": "application/zstd"},
+    "parquet": {"ContentType": "application/vnd.apache.parquet"},
+}
+# compression of archive formats, by suffix
+COMPRESSIONS = {"gz": "gzip", "zst": "zstd"}
+
+# Content-Type of formats of the aggregates cube
+CUBE_FORMATS = {
+    "json": {"ContentType": "application/json"},
+    "parquet": {"ContentType": "application/vnd.apache.parquet"},
+}
+
 VALID_STATUSES = ["suspected", "confirmed", "discarded", "omit_error"]
 
 
 def lookup_iso3(country: Optional[str]) -> str:
-    if country is None:
-        return ""
-    if country.lower() in ISO3_QUIRKS:
-        return ISO3_QUIRKS[country.lower()]
-    try:
-        matches = pycountry.countries.search_fuzzy(country)
-        if not matches:
-            logging.warning(f"No match found for country: {country}")
-            return ""
-    except Exception:
-        logging.exception(f"An exception occurred while trying to find an ISO country code for {country}")
-        return ""
-    return matches[0].alpha_3
+    return COUNTRY_RESOLVER(country)
 
 
 def setup_logger():
@@ -84,20 +113,21 @@ def setup_logger():
     rootLogger.setLevel(logging.INFO)
 
 
-def get_data(worksheet_title="Confirmed/Suspected") -> Data:
+def get_worksheets(*worksheet_titles: str, sync: bool = False) -> list[Data]:
+    """Returns rows of each worksheet, read from Google Sheets in one request,
+    or with sync, updated from rows modified since the last run"""
     logging.info("Getting data from Google Sheets")
-    client = pygsheets.authorize(service_account_env_var="GOOGLE_CREDENTIALS")
-    spreadsheet = client.open_by_key(DOCUMENT_ID)
+    if sync:
+        return [sheets.to_records(sheets_sync.sync(DOCUMENT_ID, title, DATA_BUCKET)) for title in worksheet_titles]
+    return list(sheets.get_records(DOCUMENT_ID, list(worksheet_titles)).values())
 
-    try:
-        return spreadsheet.worksheet("title", worksheet_title).get_all_records()
-    except pygsheets.WorksheetNotFound:
-        logging.error(f"Could not find worksheet with title={worksheet_title}")
-        raise
 
+def get_data(worksheet_title=LINE_LIST_WORKSHEET, sync: bool = False) -> Data:
+    return get_worksheets(worksheet_title, sync=sync)[0]
 
-def run_quality_checks(csv_data):
-    if qc_results := qc.lint_string(csv_data):
+
+def run_quality_checks(df: pd.DataFrame):
+    if qc_results := qc.lint(df):
         logging.error("Quality check failed")
         logging.error(pretty_results := qc.pretty_lint_results(qc_results))
         if (webhook_url := os.getenv("WEBHOOK_URL")):
@@ -105,9 +135,25 @@ def run_quality_checks(csv_data):
         sys.exit(1)
 
 
-def calculate_timeseries(csv_data) -> (pd.DataFrame, pd.DataFrame):
+def get_published_timeseries() -> tuple[pd.DataFrame, pd.DataFrame]:
+    logging.info("Getting published timeseries")
+    return tuple(
+        timeseries.from_csv(S3.Object(DATA_BUCKET, key).get()["Body"].read().decode("utf-8"))
+        for key in ["timeseries-confirmed.csv", "timeseries-country-confirmed.csv"]
+    )
+
+
+def calculate_timeseries(df: pd.DataFrame, incremental: bool = False) -> (pd.DataFrame, pd.DataFrame):
     logging.info("Calculating timeseries")
-    df = pd.read_csv(io.StringIO(csv_data))
+    if incremental:
+        try:
+            previous_confirmed, previous_country_confirmed = get_published_timeseries()
+            return (
+                timeseries.update_by_confirmed(df, previous_confirmed),
+                timeseries.update_by_country_confirmed(df, previous_country_confirmed),
+            )
+        except Exception:
+            logging.exception("An exception occurred while trying to update published timeseries, recalculating")
     timeseries_confirmed = timeseries.by_confirmed(df)
     timeseries_country_confirmed = timeseries.by_country_confirmed(df)
     return timeseries_confirmed, timeseries_country_confirmed
@@ -123,54 +169,161 @@ def get_source_urls(data: Data) -> set[str]:
     return source_urls
 
 
-def clean_data(data: Data, id_prefix: str = "") -> Data:
+def clean_data(data: Data, id_prefix: str = "", workers: int = 1) -> list[Record]:
+    """Prefixes IDs, adds Country_ISO3 and removes keys which are not in the
+    data dictionary, a column at a time, and returns compact records. With workers > 1, chunks of
+    CLEAN_CHUNK_SIZE cases are cleaned in that many processes."""
     logging.info("Cleaning data")
+    if workers > 1 and len(data) > CLEAN_CHUNK_SIZE:
+        chunks = [data[i:i + CLEAN_CHUNK_SIZE] for i in range(0, len(data), CLEAN_CHUNK_SIZE)]
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            return list(chain.from_iterable(executor.map(clean_data, chunks, repeat(id_prefix))))
+
+    ids = [id_prefix + str(case["ID"]) for case in data]
+    countries = [case.get("Country") for case in data]
+    # each distinct country is only looked up once
+    iso3 = {country: lookup_iso3(country) for country in set(countries)}
+    # keys to keep, in their original order, for each distinct set of keys
+    layouts: dict[tuple[str, ...], tuple[tuple[str, ...], int, int]] = {}
+    records = RecordFactory()
     cleaned_data = []
-    with concurrent.futures.ProcessPoolExecutor() as executor:
-        for result in executor.map(clean_case, data, repeat(id_prefix)):
-            cleaned_data.append(result)
+    for case, id_, country in zip(data, ids, countries):
+        if (layout := layouts.get(case_keys := tuple(case))) is None:
+            keys = [k for k in case_keys if k in FIELD_SET]
+            if "Country_ISO3" not in keys:
+                keys.append("Country_ISO3")
+            layout = layouts[case_keys] = (tuple(keys), keys.index("ID"), keys.index("Country_ISO3"))
+        keys, id_index, iso3_index = layout
+        values = [case.get(k) for k in keys]
+        values[id_index] = id_
+        values[iso3_index] = iso3[country]
+        cleaned_data.append(records.from_values(keys, values))
+    logging.info(f"Country lookups: {COUNTRY_RESOLVER.stats()}")
     return cleaned_data
 
 
-def clean_case(case: dict, id_prefix: str):
-    case["ID"] = id_prefix + str(case["ID"])
-    case["Country_ISO3"] = lookup_iso3(case.get("Country"))
-    # remove keys which are not in data dictionary
-    for key in set(case.keys()) - set(FIELDS):
-        case.pop(key)
-    return case
+def write_data(data: Iterable[Mapping[str, Any]], json_file: IO[str], csv_file: IO[str],
+               fields: Optional[list[str]] = FIELDS, ndjson: bool = False):
+    """Writes data as JSON and CSV one row at a time, JSON is written as an
+    array (same as json.dumps(data)) or as newline delimited JSON"""
+    csv_writer = csv.DictWriter(csv_file, fieldnames=fields)
+    csv_writer.writeheader()
+    if not ndjson:
+        json_file.write("[")
+    for i, row in enumerate(data):
+        csv_writer.writerow(row)
+        if ndjson:
+            json_file.write(json.dumps(row, default=dict) + "\n")
+        else:
+            json_file.write((", " if i else "") + json.dumps(row, default=dict))
+    if not ndjson:
+        json_file.write("]")
 
 
 def format_data(data: Data, fields: Optional[list[str]] = FIELDS) -> tuple[str, str]:
     logging.info("Formatting data")
-    json_data = json.dumps(data)
-    csv_data = io.StringIO()
-    csv_writer = csv.DictWriter(csv_data, fieldnames=fields)
-    csv_writer.writeheader()
-    for row in data:
-        csv_writer.writerow(row)
-    return json_data, csv_data.getvalue()
+    json_data, csv_data = io.StringIO(), io.StringIO()
+    write_data(data, json_data, csv_data, fields)
+    return json_data.getvalue(), csv_data.getvalue()
 
 
-def store_data(json_data: str, csv_data: str,
-               timeseries_confirmed: str, timeseries_country_confirmed: str):
+def spool_data(data: Iterable[Mapping[str, Any]], fields: Optional[list[str]] = FIELDS,
+               ndjson: bool = False) -> tuple[IO[bytes], IO[bytes]]:
+    """Formats data as JSON and CSV in temporary files, which are kept in
+    memory up to SPOOL_SIZE and then written to disk"""
+    logging.info("Formatting data")
+    # hashed as they are written, for the bucket index
+    json_data, csv_data = HashingSpool(SPOOL_SIZE), HashingSpool(SPOOL_SIZE)
+    json_text = io.TextIOWrapper(json_data, encoding="utf-8", newline="")
+    csv_text = io.TextIOWrapper(csv_data, encoding="utf-8", newline="")
+    write_data(data, json_text, csv_text, fields, ndjson)
+    # flush and leave the underlying files open
+    json_text.detach()
+    csv_text.detach()
+    json_data.seek(0)
+    csv_data.seek(0)
+    return json_data, csv_data
+
+
+def compress(data: IO[bytes], encoding: str) -> IO[bytes]:
+    data.seek(0)
+    compressed = HashingSpool(SPOOL_SIZE)
+    if encoding == "gzip":
+        with gzip.GzipFile(fileobj=compressed, mode="wb") as fp:
+            shutil.copyfileobj(data, fp)
+    elif encoding == "zstd":
+        import zstandard  # optional dependency
+        zstandard.ZstdCompressor().copy_stream(data, compressed)
+    else:
+        raise ValueError(f"Unknown encoding: {encoding}")
+    compressed.seek(0)
+    return compressed
+
+
+def format_archives(data: Data | pd.DataFrame, json_data: IO[bytes], csv_data: IO[bytes],
+                    formats: Iterable[str]) -> dict[str, bytes | IO[bytes]]:
+    """Returns data in additional archive formats (keys of ARCHIVE_FORMATS),
+    skipping formats whose optional dependencies (pyarrow, zstandard) are missing"""
+    logging.info("Formatting additional archives")
+    archives = {}
+    for fmt in formats:
+        try:
+            if fmt == "parquet":
+                archives[fmt] = schema.to_parquet(data)
+            else:
+                source = csv_data if fmt.startswith("csv") else json_data
+                archives[fmt] = compress(source, COMPRESSIONS[fmt.rsplit(".", 1)[1]])
+        except ImportError as exc:
+            logging.warning(f"Skipping {fmt} archive, optional dependency missing: {exc}")
+    return archives
+
+
+def store_data(json_data: str | IO[bytes], csv_data: str | IO[bytes],
+               timeseries_confirmed: str, timeseries_country_confirmed: str,
+               archives: Optional[dict[str, bytes | IO[bytes]]] = None):
     logging.info("Uploading data to S3")
     now = datetime.today()
+    archives = archives or {}
     try:
-        S3.Object(DATA_BUCKET, f"{DATA_FOLDER}/{now}.csv").put(Body=csv_data)
-        S3.Object(DATA_BUCKET, "latest.csv").put(Body=csv_data)
-        S3.Object(DATA_BUCKET, f"{DATA_FOLDER}/{now}.json").put(Body=json_data)
-        S3.Object(DATA_BUCKET, "latest.json").put(Body=json_data)
-        S3.Object(DATA_BUCKET, "timeseries-confirmed.csv").put(Body=timeseries_confirmed)
-        S3.Object(DATA_BUCKET, "timeseries-country-confirmed.csv").put(Body=timeseries_country_confirmed)
+        upload.put_objects(
+            {
+                (DATA_BUCKET, f"{DATA_FOLDER}/{now}.csv"): csv_data,
+                (DATA_BUCKET, f"{DATA_FOLDER}/{now}.json"): json_data,
+                (DATA_BUCKET, "timeseries-confirmed.csv"): timeseries_confirmed,
+                (DATA_BUCKET, "timeseries-country-confirmed.csv"): timeseries_country_confirmed,
+                **{(DATA_BUCKET, f"{DATA_FOLDER}/{now}.{fmt}"): body for fmt, body in archives.items()},
+            },
+            aliases={
+                (DATA_BUCKET, "latest.csv"): (DATA_BUCKET, f"{DATA_FOLDER}/{now}.csv"),
+                (DATA_BUCKET, "latest.json"): (DATA_BUCKET, f"{DATA_FOLDER}/{now}.json"),
+            },
+            extra_args={(DATA_BUCKET, f"{DATA_FOLDER}/{now}.{fmt}"): ARCHIVE_FORMATS[fmt] for fmt in archives},
+        )
     except Exception as exc:
         logging.exception(f"An exception occurred while trying to upload data files")
         raise
+    index_objects(DATA_FOLDER, {
+        f"{now}.csv": csv_data,
+        f"{now}.json": json_data,
+        **{f"{now}.{fmt}": body for fmt, body in archives.items()},
+    })
+
+
+def store_dataset(df: pd.DataFrame):
+    logging.info("Uploading partitioned Parquet dataset to S3")
+    try:
+        dataset.publish(df, DATA_BUCKET)
+    except ImportError as exc:
+        logging.warning(f"Skipping dataset, optional dependency missing: {exc}")
+    except Exception:
+        logging.exception("An exception occurred while trying to upload the partitioned dataset")
+        raise
 
 
 def urls_to_pdfs(source_urls: list[str] | set[str], folder: str, names: list[str]=None) -> list[str]:
+    """Saves source URLs as PDFs concurrently (see archiver) and stores them
+    in folder (see document_store), skipping those which have not changed"""
     logging.info("Converting websites into PDFs")
-    pdfs = []
     if not names:
         names = [f"{urlparse(source_url).path.replace('/', '_')[1:]}.pdf" for source_url in source_urls]
     else:
@@ -181,86 +334,136 @@ def urls_to_pdfs(source_urls: list[str] | set[str], folder: str, names: list[str
             raise
 
     names = [((n + ".pdf") if not n.endswith(".pdf") else n) for n in names]  # ensure .pdf suffix
+    store = document_store(folder)
+    if not store.manifest:
+        # documents stored by name before there was a manifest are kept
+        for source_url, name in zip(source_urls, names):
+            if bucket_contains(name, folder):
+                logging.info(f"Found {name} in bucket, adding it to manifest")
+                store.adopt(source_url, name)
+
+    targets = {}
     for source_url, name in zip(source_urls, names):
-        if bucket_contains(name, folder):
-            logging.info(f"Found {name} in bucket, skipping it")
+        if name in targets:
+            logging.info(f"Already saving {targets[name]} to {name}, skipping {source_url}")
             continue
-        logging.info(f"Saving content from {source_url} to {name}")
-        if ".pdf" not in source_url:
-            try:
-                pdfkit.from_url(source_url, name, options={"page-size": "Letter"})
-                pdfs.append(name)
-            except Exception:
-                logging.exception(f"An exception occurred while trying to convert {source_url} to {name}")
-        else:
-            try:
-                r = requests.get(source_url)
-                with open(name, 'wb') as fp:
-                    fp.write(r.content)
-                pdfs.append(name)
-            except Exception:
-                logging.exception(f"An exception occurred while trying to download {source_url} to {name}")
+        if not store.needs_fetch(source_url, name):
+            logging.info(f"Stored {name} from {source_url} recently, skipping it")
+            continue
+        targets[name] = source_url
 
-    return pdfs
+    index = bucket_index(folder)
+
+    def on_archived(pdf: str, url: str, validators: dict[str, str]):
+        if store.store(url, pdf, pdf, validators) == pdf:
+            # hash of the fetched content, computed by the archiver (or the store)
+            index.add(pdf, os.path.getsize(pdf), store.validators(url, pdf).get("sha256"))
+
+    try:
+        return archiver.archive_urls(
+            targets,
+            on_archived=on_archived,
+            previous={name: store.validators(url, name) for name, url in targets.items()},
+            on_unchanged=store.record,
+            stored=lambda pdf, sha256: store.stored_as(sha256, pdf) is not None,
+        )
+    finally:
+        store.save()
+        # names without their own object point at the object with their content
+        index.set_aliases(store.aliases())
+        index.save()
+
+
+def document_store(folder: str) -> DocumentStore:
+    if folder not in DOCUMENT_STORES:
+        DOCUMENT_STORES[folder] = DocumentStore(DATA_BUCKET, folder)
+    return DOCUMENT_STORES[folder]
+
+
+def bucket_index(folder: str) -> BucketIndex:
+    if folder not in BUCKET_INDEXES:
+        BUCKET_INDEXES[folder] = BucketIndex(DATA_BUCKET, folder)
+    return BUCKET_INDEXES[folder]
 
 
 def bucket_contains(file_name: str, folder: str) -> bool:
-    global BUCKET_CONTENTS
-    if not BUCKET_CONTENTS:
-        objects = S3.Bucket(DATA_BUCKET).objects.all()
-        BUCKET_CONTENTS = [o.key.split("/")[1] for o in objects if o.key.startswith(f"{folder}/")]
-    return file_name in BUCKET_CONTENTS
+    return file_name in bucket_index(folder)
 
 
-def store_pdfs(pdfs: list[str], folder: str):
-    logging.info("Uploading PDFs to S3")
-    for pdf in pdfs:
-        try:
-            S3.Object(DATA_BUCKET, f"{folder}/{pdf}").upload_file(pdf)
-        except Exception:
-            logging.exception(f"An exception occurred while trying to upload {pdf}")
-            raise
+def index_objects(folder: str, objects: dict[str, str | bytes | IO[bytes]]):
+    """Adds objects (name -> body) stored in folder to its index, and saves
+    it for s3_ui. Failures are only logged, as the objects are stored, and
+    are added when the folder is next listed."""
+    index = bucket_index(folder)
+    try:
+        for name, body in objects.items():
+            index.add_object(name, body)
+        index.save()
+    except Exception:
+        logging.exception(f"An exception occurred while trying to update the index of {folder}")
 
 
-def aggregate_data(data: Data, today: str=None) -> tuple[dict[str, int], dict[str, list[dict[str, Any]]]]:
+def aggregate_data(data: Data | pd.DataFrame, today: str=None) -> tuple[dict[str, int], dict[str, list[dict[str, Any]]]]:
     logging.info("Getting total counts of cases")
     today = today or date.today().strftime("%Y-%m-%d")
-    total_count = {"total": 0, "confirmed": 0}
-    aggregates: dict[str, dict[str, int]] = defaultdict(lambda: defaultdict(int))  # nested defaultdict
-    for case in data:
-        country = case.get("Country_ISO3")
-        if not country:
-            raise ValueError(f"No country found for case: {case}")
-        status = case.get("Status")
-        if not status:
-            raise ValueError(f"No status found for case: {case}")
-        if not status in VALID_STATUSES:
-            logging.warning(f"Case status {status} not in {VALID_STATUSES}")
-        if status in ["discarded", "omit_error"]:
-            continue
-        aggregates[country][status] += 1
-        total_count["total"] += 1
-        if status == "confirmed":
-            total_count["confirmed"] += 1
-    country_aggregates = {today: [{k: {"confirmed": v["confirmed"], "suspected": v["suspected"]}} for k, v in aggregates.items()]}
+    df = data if isinstance(data, pd.DataFrame) else schema.from_records(data)
+    if (missing := df.Country_ISO3.isna()).any():
+        raise ValueError(f"No country found for case: {df[missing].iloc[0].dropna().to_dict()}")
+    if (missing := df.Status.isna()).any():
+        raise ValueError(f"No status found for case: {df[missing].iloc[0].dropna().to_dict()}")
+    for status in df.Status[~df.Status.isin(VALID_STATUSES)].unique():
+        logging.warning(f"Case status {status} not in {VALID_STATUSES}")
+    df = df[~df.Status.isin(["discarded", "omit_error"])]
+    counts = df.groupby(["Country_ISO3", "Status"], observed=True).size()
+    total_count = {"total": len(df), "confirmed": int((df.Status == "confirmed").sum())}
+    country_aggregates = {today: [
+        {k: {status: int(counts.get((k, status), 0)) for status in ["confirmed", "suspected"]}}
+        for k in df.Country_ISO3.unique()  # in order of first case
+    ]}
     return total_count, country_aggregates
 
 
 def store_aggregates(total_count: str, country_aggregates: str):
     logging.info("Uploading case counts to S3")
     try:
-        S3.Object(AGGREGATES_BUCKET, "total/latest.json").put(Body=total_count)
-        S3.Object(AGGREGATES_BUCKET, "country/latest.json").put(Body=country_aggregates)
+        upload.put_objects({
+            (AGGREGATES_BUCKET, "total/latest.json"): total_count,
+            (AGGREGATES_BUCKET, "country/latest.json"): country_aggregates,
+        })
     except Exception as exc:
         logging.exception("An exception occurred while trying to upload latest aggregates and totals files")
         raise
 
 
+def store_cube(df: pd.DataFrame, formats: Iterable[str] = ("json",)):
+    """Stores counts of cases by each of aggregates.DIMENSIONS, and the cube
+    they are summed from in formats (keys of CUBE_FORMATS)"""
+    logging.info("Uploading aggregates cube")
+    cube = aggregates.cube(df)
+    objects = {(AGGREGATES_BUCKET, "cube/summary.json"): json.dumps(aggregates.summary(cube))}
+    extra = {}
+    for fmt in formats:
+        try:
+            body = aggregates.to_parquet(cube) if fmt == "parquet" else aggregates.to_json(cube)
+        except ImportError as exc:
+            logging.warning(f"Skipping {fmt} cube, optional dependency missing: {exc}")
+            continue
+        objects[(AGGREGATES_BUCKET, f"cube/latest.{fmt}")] = body
+        extra[(AGGREGATES_BUCKET, f"cube/latest.{fmt}")] = CUBE_FORMATS[fmt]
+    try:
+        upload.put_objects(objects, extra_args=extra)
+    except Exception:
+        logging.exception("An exception occurred while trying to upload aggregates cube")
+        raise
+
+
 def store_timeseries(by_confirmed: pd.DataFrame, by_country_confirmed: pd.DataFrame):
     logging.info("Uploading timeseries to aggregates")
     try:
-        S3.Object(AGGREGATES_BUCKET, "timeseries/confirmed.json").put(Body=timeseries.to_json(by_confirmed))
-        S3.Object(AGGREGATES_BUCKET, "timeseries/country_confirmed.json").put(Body=timeseries.to_json(by_country_confirmed))
+        upload.put_objects({
+            (AGGREGATES_BUCKET, "timeseries/confirmed.json"): timeseries.to_json(by_confirmed),
+            (AGGREGATES_BUCKET, "timeseries/country_confirmed.json"): timeseries.to_json(by_country_confirmed),
+        })
     except Exception as exc:
         logging.exception("An exception occurred while trying to upload timeseries to aggregates")
         raise
@@ -270,23 +473,37 @@ def store_case_definitions(case_definition_urls: Path):
     """Retrieve and store case definitions"""
     with case_definition_urls.open() as fp:
         case_definitions = json.load(fp)
-        pdfs = urls_to_pdfs(
-                source_urls=case_definitions.values(),
+        urls_to_pdfs(
+                source_urls=list(case_definitions.values()),
                 folder=CASE_DEFINITIONS_FOLDER,
-                names=case_definitions.keys()
+                names=list(case_definitions.keys())
         )
-        store_pdfs(pdfs, folder=CASE_DEFINITIONS_FOLDER)
 
 
 def store_ecdc():
     logging.info("Fetching and storing ECDC data")
-    for div in TARGET_DIVS:
-        now = datetime.today()
-        logging.info(f"Getting data from div {div}")
-        file_name = f"ecdc/ecdc-{div}.csv"
-        S3.Object(DATA_BUCKET, file_name).put(Body=get_ecdc_data(div=div))
-        file_name = f"ecdc-archives/{now}-ecdc-{div}.csv"
-        S3.Object(DATA_BUCKET, file_name).put(Body=get_ecdc_data(div=div))
+    # only cached once stored, so a report which failed to upload is fetched again
+    if (response := http_cache.get(ECDC_URL, commit=False)).not_modified:
+        logging.info("ECDC report not modified since the last run, skipping it")
+        return
+    now = datetime.today()
+    latest, archived = {}, {}
+    for div, data in get_all_ecdc_data(TARGET_DIVS, content=response.content).items():
+        # latest and archived copies are the same bytes
+        body = data.encode("utf-8")
+        latest[f"ecdc-{div}.csv"] = body
+        archived[f"{now}-ecdc-{div}.csv"] = body
+    try:
+        upload.put_objects({
+            **{(DATA_BUCKET, f"{ECDC_FOLDER}/{name}"): body for name, body in latest.items()},
+            **{(DATA_BUCKET, f"{ECDC_ARCHIVES_FOLDER}/{name}"): body for name, body in archived.items()},
+        })
+    except Exception:
+        logging.exception("An exception occurred while trying to upload ECDC data")
+        raise
+    index_objects(ECDC_FOLDER, latest)
+    index_objects(ECDC_ARCHIVES_FOLDER, archived)
+    response.commit()
 
 
 @click.command()
@@ -294,33 +511,57 @@ def store_ecdc():
 @click.option("--sources", is_flag=True, show_default=True, default=False, help="Backup source URLs as PDFs")
 @click.option("--casedefs", is_flag=True, show_default=True, default=True, help="Backup case definition files")
 @click.option("--ecdc", is_flag=True, show_default=True, default=True, help="Backup ECDC data")
-def run(gsheets, sources, casedefs, ecdc):
+@click.option("--incremental", is_flag=True, show_default=True, default=False,
+              help="Only recalculate timeseries from the earliest date with modified cases")
+@click.option("--archive-format", "archive_formats", multiple=True, type=click.Choice(list(ARCHIVE_FORMATS)),
+              help="Additional archive format, can be repeated")
+@click.option("--dataset", "partitioned", is_flag=True, show_default=True, default=False,
+              help="Store Parquet dataset partitioned by country and month of confirmation")
+@click.option("--snapshot", is_flag=True, show_default=True, default=False,
+              help="Store delta encoded snapshot of data")
+@click.option("--sync", is_flag=True, show_default=True, default=False,
+              help="Only read rows of Google Sheets modified since the last run")
+@click.option("--cube-format", "cube_formats", multiple=True, type=click.Choice(list(CUBE_FORMATS)),
+              default=["json"], show_default=True, help="Format of aggregates cube, can be repeated")
+@click.option("--workers", type=int, show_default=True, default=1,
+              help="Processes used to clean data, in chunks of CLEAN_CHUNK_SIZE cases")
+def run(gsheets, sources, casedefs, ecdc, incremental, archive_formats, partitioned, snapshot, sync, cube_formats,
+        workers):
     setup_logger()
     logging.info("Starting script")
-    data = get_data()
     if gsheets:
-        endemic_data = get_data("Endemic Countries")
-        data = clean_data(data, id_prefix="N")
-        endemic_data = clean_data(endemic_data, id_prefix="E")
-        json_data, csv_data = format_data(data + endemic_data)
-
-        run_quality_checks(csv_data)
-
-        ts_conf, ts_ctry_conf = calculate_timeseries(csv_data)
-
+        data, endemic_data = get_worksheets(LINE_LIST_WORKSHEET, ENDEMIC_WORKSHEET, sync=sync)
+        data = clean_data(data, id_prefix="N", workers=workers)
+        endemic_data = clean_data(endemic_data, id_prefix="E", workers=workers)
+        cases = data + endemic_data
+        # parsed once: checked as is, then typed for timeseries and aggregates
+        df = schema.from_records(cases)
+        run_quality_checks(df)
+        df = schema.to_dataframe(df)
+
+        ts_conf, ts_ctry_conf = calculate_timeseries(df, incremental)
+
+        json_data, csv_data = spool_data(cases)
         store_data(json_data, csv_data,
                    timeseries.to_csv(ts_conf),
-                   timeseries.to_csv(ts_ctry_conf))
-
-        total_count, country_aggregates = aggregate_data(data + endemic_data)
+                   timeseries.to_csv(ts_ctry_conf),
+                   format_archives(df, json_data, csv_data, archive_formats))
+        if partitioned:
+            store_dataset(df)
+        if snapshot:
+            snapshots.store_snapshot(DATA_BUCKET, cases)
+
+        total_count, country_aggregates = aggregate_data(df)
         store_aggregates(json.dumps(total_count), json.dumps(country_aggregates))
+        store_cube(df, cube_formats)
         store_timeseries(ts_conf, ts_ctry_conf)
 
     if sources:
         try:
+            if not gsheets:
+                data = get_data(sync=sync)
             source_urls = get_source_urls(data)
-            pdfs = urls_to_pdfs(source_urls, folder=SOURCES_FOLDER)
-            store_pdfs(pdfs, folder=SOURCES_FOLDER)
+            urls_to_pdfs(source_urls, folder=SOURCES_FOLDER)
         except Exception as e:
             logging.error(f"Error occurred in saving source URLs: {e}")
 
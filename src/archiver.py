@@ -0,0 +1,216 @@
+"""
+Archive web pages and PDFs concurrently
+
+Pages are rendered to PDF with wkhtmltopdf and PDFs are downloaded with
+the shared, connection pooled session of http_cache, in a bounded thread
+pool. URLs are grouped by host, and at most MAX_PER_HOST tasks of the pool
+work through the URLs of each host, so requests to a host are limited
+without pool workers waiting on a slow host. Every render or download has
+a timeout. Each archived file is passed to a callback as soon as it is
+ready, so it can be uploaded while other URLs are fetched.
+
+ETag and Last-Modified headers of a previous fetch are sent back as
+If-None-Match and If-Modified-Since, so documents which have not changed
+are neither downloaded nor rendered again. Documents fetched again are
+compared with the sha256 of the previously fetched content: web pages
+are fetched once, and only rendered (from the fetched HTML) if their
+content changed, as rendered PDFs embed the time they were made.
+"""
+
+import os
+import re
+import hashlib
+import logging
+import subprocess
+from html import escape
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Optional
+from urllib.parse import urlparse
+
+import pdfkit
+import requests
+
+from http_cache import SESSION
+
+MAX_WORKERS = os.cpu_count() or 4
+MAX_PER_HOST = 2
+TIMEOUT = 60  # seconds, for each download or render
+CHUNK_SIZE = 64 * 1024
+PDF_OPTIONS = {"page-size": "Letter"}
+
+
+def host_lanes(targets: dict[str, str], max_per_host: int = MAX_PER_HOST) -> list[list[tuple[str, str]]]:
+    """Returns (path, URL) of targets grouped by host, as a list shared by
+    up to max_per_host lanes of each host, interleaving hosts"""
+    by_host = defaultdict(list)
+    for path, url in targets.items():
+        by_host[urlparse(url).netloc.lower()].append((path, url))
+    return [
+        pending
+        for lane in range(max_per_host)
+        for pending in by_host.values()
+        if lane < len(pending)
+    ]
+
+
+VALIDATORS = {"ETag": "If-None-Match", "Last-Modified": "If-Modified-Since"}
+
+Validators = dict[str, str]  # response header -> value, and sha256 of the content
+
+
+def validators(response: requests.Response) -> Validators:
+    "Returns ETag and Last-Modified headers of response"
+    return {header: response.headers[header] for header in VALIDATORS if header in response.headers}
+
+
+def conditional_headers(previous: Optional[Validators]) -> dict[str, str]:
+    return {VALIDATORS[header]: value for header, value in (previous or {}).items() if header in VALIDATORS}
+
+
+def with_base(html: bytes, url: str) -> bytes:
+    "Returns html with a <base> element, so relative links resolve against url when rendered from stdin"
+    base = f'<base href="{escape(url)}">'.encode("utf-8")
+    if head := re.search(rb"<head(\s[^>]*)?>", html, re.IGNORECASE):
+        return html[:head.end()] + base + html[head.end():]
+    return base + html
+
+
+def render_pdf(url: str, path: str, html: Optional[bytes] = None):
+    """Renders web page at url, or its already fetched html, to a PDF at path
+    with wkhtmltopdf"""
+    if html is None:
+        args = pdfkit.PDFKit(url, "url", options=PDF_OPTIONS).command(path)
+    else:
+        args = pdfkit.PDFKit("", "string", options=PDF_OPTIONS).command(path)  # reads stdin
+    result = subprocess.run(args, input=html and with_base(html, url), capture_output=True, timeout=TIMEOUT)
+    pdfkit.PDFKit.handle_error(result.returncode, (result.stderr or result.stdout).decode("utf-8", errors="replace"))
+
+
+def download_pdf(url: str, path: str, previous: Optional[Validators] = None) -> Optional[Validators]:
+    """Streams PDF at url to path, unless unchanged since previous validators
+    (returns None). Returns validators and sha256 of the downloaded PDF."""
+    with SESSION.get(url, stream=True, timeout=TIMEOUT, headers=conditional_headers(previous)) as r:
+        if r.status_code == 304:
+            return None
+        r.raise_for_status()
+        digest = hashlib.sha256()
+        with open(path, "wb") as fp:
+            for chunk in r.iter_content(CHUNK_SIZE):
+                digest.update(chunk)
+                fp.write(chunk)
+        return {**validators(r), "sha256": digest.hexdigest()}
+
+
+def fetch_page(url: str, previous: Optional[Validators] = None) -> Optional[tuple[bytes, Validators]]:
+    """Returns content, validators and sha256 of web page at url, or None if
+    unchanged since previous validators"""
+    r = SESSION.get(url, timeout=TIMEOUT, headers=conditional_headers(previous))
+    if r.status_code == 304:
+        return None
+    r.raise_for_status()
+    return r.content, {**validators(r), "sha256": hashlib.sha256(r.content).hexdigest()}
+
+
+def archive(
+    url: str, path: str, previous: Optional[Validators] = None, stored: Callable[[str], bool] = lambda sha256: False
+) -> Optional[tuple[Validators, bool]]:
+    """Saves url to path as a PDF if its content changed since the previous
+    fetch (previous validators and sha256), and is not already stored from
+    another URL (stored(sha256)). Returns validators and sha256 of the
+    content, and whether it needs storing, or None if the server reports
+    it unchanged.
+
+    Content of a document adopted without a hash (previous has "adopted")
+    is taken as the baseline of the stored copy, so it is not saved."""
+    previous = previous or {}
+    if ".pdf" in url:
+        current = download_pdf(url, path, previous)
+        html = None
+    else:
+        try:
+            fetched = fetch_page(url, previous)
+        except requests.RequestException:
+            # wkhtmltopdf may still succeed, and will report its own errors
+            logging.warning(f"Could not fetch {url}, rendering it from its URL")
+            render_pdf(url, path)
+            return {}, True
+        html, current = fetched or (None, None)
+    if current is None:
+        return None
+    changed = current["sha256"] != previous.get("sha256") and not previous.get("adopted") and not stored(current["sha256"])
+    if changed and html is not None:
+        render_pdf(url, path, html)
+    elif not changed and os.path.exists(path) and html is None:
+        os.remove(path)  # downloaded again, but the same as a stored copy
+    return current, changed
+
+
+def archive_urls(
+    targets: dict[str, str],
+    on_archived: Optional[Callable[[str, str, Validators], None]] = None,
+    previous: Optional[dict[str, Validators]] = None,
+    max_workers: int = MAX_WORKERS,
+    max_per_host: int = MAX_PER_HOST,
+    on_unchanged: Optional[Callable[[str, str, Validators], None]] = None,
+    stored: Optional[Callable[[str, str], bool]] = None,
+) -> list[str]:
+    """Archives each URL of targets (path -> URL) to its path concurrently,
+    calling on_archived(path, url, validators) from the worker thread once
+    a URL is archived. URLs with previous validators (by path) are skipped
+    if the server reports them unchanged, and on_unchanged(path, url,
+    validators) is called for those fetched again with unchanged content,
+    or content already stored for another path (stored(path, sha256)).
+
+    Returns paths which were archived. Failures to archive a URL are logged
+    and do not stop other URLs. If a callback fails, e.g. to store a file,
+    the remaining URLs are still archived before the first exception is
+    raised, so no file is reported as archived without being stored.
+    """
+    previous = previous or {}
+
+    def work(path: str, url: str) -> bool:
+        logging.info(f"Saving content from {url} to {path}")
+        try:
+            result = archive(url, path, previous.get(path), lambda sha256: bool(stored and stored(path, sha256)))
+        except Exception:
+            logging.exception(f"An exception occurred while trying to archive {url} to {path}")
+            return False
+        if result is None:
+            logging.info(f"{url} not modified, skipping it")
+            return False
+        current, changed = result
+        if not changed:
+            logging.info(f"Content of {url} unchanged, skipping it")
+            if on_unchanged:
+                on_unchanged(path, url, current)
+            return False
+        if on_archived:
+            on_archived(path, url, current)
+        return True
+
+    def lane(pending: list[tuple[str, str]]) -> tuple[list[str], list[Exception]]:
+        # lanes of a host share its pending list, list.pop(0) is atomic
+        archived, errors = [], []
+        while True:
+            try:
+                path, url = pending.pop(0)
+            except IndexError:
+                return archived, errors
+            try:
+                if work(path, url):
+                    archived.append(path)
+            except Exception as exc:
+                logging.exception(f"An exception occurred while handling {path} archived from {url}")
+                errors.append(exc)
+
+    archived, errors = [], []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(lane, pending) for pending in host_lanes(targets, max_per_host)]
+        for future in as_completed(futures):
+            lane_archived, lane_errors = future.result()
+            archived.extend(lane_archived)
+            errors.extend(lane_errors)
+    if errors:
+        raise errors[0]
+    return archived
@@ -0,0 +1,175 @@
+"""
+Index of objects under a folder (key prefix) of a bucket
+
+The name, size, modification time and (for objects stored by this job)
+sha256 of each object are kept in a small manifest object stored in the
+folder. Hashes are computed as files are written (HashingSpool), or from
+bodies already in memory, so indexing does not read uploads again. If there is none yet, the folder is
+listed once with paginated list_objects_v2 calls restricted to the folder.
+Objects are added to the index as they are uploaded and the manifest is
+written back with save(), so later runs read one object instead of
+listing the folder, and s3_ui renders folder pages from the manifest.
+The folder is listed again once the last listing is older than
+REFRESH_INTERVAL, so objects stored by other means (manual uploads, seed
+data) are picked up.
+"""
+
+import os
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import IO, Any, Optional
+
+from botocore.exceptions import ClientError
+
+import upload
+
+MANIFEST_NAME = ".index.json"
+REFRESH_INTERVAL = timedelta(days=1)
+
+Entry = dict[str, Any]  # name, size, last_modified, optionally sha256, and key if stored as another object
+
+
+class HashingSpool(tempfile.SpooledTemporaryFile):
+    "Spooled temporary file which hashes what is written to it, from the start"
+
+    def __init__(self, max_size: int = 0):
+        super().__init__(max_size)
+        self.digest = hashlib.sha256()
+
+    def write(self, s) -> int:
+        self.digest.update(s)
+        return super().write(s)
+
+
+def describe(body: str | bytes | IO[bytes]) -> tuple[int, Optional[str]]:
+    """Returns size and sha256 of body, as it is uploaded by upload.put_object(),
+    without reading files again (their sha256 is only known for a HashingSpool)"""
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    if isinstance(body, bytes):
+        return len(body), hashlib.sha256(body).hexdigest()
+    size = body.seek(0, os.SEEK_END)
+    body.seek(0)
+    return size, body.digest.hexdigest() if isinstance(body, HashingSpool) else None
+
+
+class BucketIndex:
+    "Objects directly under bucket/folder/"
+
+    def __init__(self, bucket: str, folder: str, client=None):
+        self.bucket = bucket
+        self.folder = folder
+        self.client = client or upload.S3_CLIENT
+        self.lock = threading.Lock()
+        self.changed = False
+        self.listed: Optional[datetime] = None
+        self._entries: Optional[dict[str, Entry]] = None
+
+    @property
+    def manifest_key(self) -> str:
+        return f"{self.folder}/{MANIFEST_NAME}"
+
+    @property
+    def entries(self) -> dict[str, Entry]:
+        with self.lock:
+            if self._entries is None:
+                self._entries = self.read_manifest()
+                if self._entries is None or self.listed < datetime.now(timezone.utc) - REFRESH_INTERVAL:
+                    self._entries = self.list_entries()
+                    self.changed = True
+            return self._entries
+
+    @property
+    def names(self):
+        return self.entries.keys()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def read_manifest(self) -> Optional[dict[str, Entry]]:
+        try:
+            body = self.client.get_object(Bucket=self.bucket, Key=self.manifest_key)["Body"].read()
+        except ClientError as exc:
+            if exc.response.get("Error", {}).get("Code") in ["NoSuchKey", "404"]:
+                return None
+            raise
+        manifest = json.loads(body)
+        if isinstance(manifest, list):
+            logging.info(f"Manifest of {self.bucket}/{self.folder} only has names, listing folder")
+            return None
+        # manifests from before listings were recorded are listed again
+        self.listed = datetime.fromisoformat(manifest.get("listed", "1970-01-01T00:00:00+00:00"))
+        return {e["name"]: e for e in manifest["files"]}
+
+    def list_entries(self) -> dict[str, Entry]:
+        logging.info(f"Listing objects in {self.bucket}/{self.folder}")
+        self.listed = datetime.now(timezone.utc)
+        entries = {}
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=f"{self.folder}/"):
+            for o in page.get("Contents", []):
+                name = o["Key"].removeprefix(f"{self.folder}/")
+                # manifests are hidden, and only names directly in the folder are kept
+                if not name.startswith(".") and "/" not in name:
+                    entries[name] = {"name": name, "size": o["Size"], "last_modified": o["LastModified"].isoformat()}
+        return entries
+
+    def add(self, name: str, size: int, sha256: Optional[str] = None, last_modified: Optional[datetime] = None):
+        "Adds or replaces entry of an object stored as folder/name"
+        entries = self.entries
+        entry = {
+            "name": name,
+            "size": size,
+            "last_modified": (last_modified or datetime.now(timezone.utc)).isoformat(),
+            **({"sha256": sha256} if sha256 else {}),
+        }
+        with self.lock:
+            entries[name] = entry
+            self.changed = True
+
+    def add_object(self, name: str, body: str | bytes | IO[bytes], last_modified: Optional[datetime] = None):
+        "Adds entry of body, stored as folder/name"
+        self.add(name, *describe(body), last_modified)
+
+    def set_aliases(self, aliases: dict[str, str]):
+        """Points entries of names without their own object at the object
+        with their content (alias -> name), e.g. from DocumentStore.aliases()"""
+        entries = self.entries
+        with self.lock:
+            for name, entry in list(entries.items()):
+                if "key" in entry and name not in aliases:
+                    # given its own object, with the same content
+                    entries[name] = {k: v for k, v in entry.items() if k != "key"}
+                    self.changed = True
+            for name, key in aliases.items():
+                if key in entries and entries.get(name, {}).get("key") != key:
+                    entries[name] = {**entries[key], "name": name, "key": key}
+                    self.changed = True
+
+    def refresh(self):
+        "Lists the folder again, e.g. if objects were stored without updating the index"
+        entries = self.list_entries()
+        with self.lock:
+            self._entries = entries
+            self.changed = True
+
+    def save(self):
+        "Writes manifest if objects were listed or added since it was read"
+        with self.lock:
+            if not self.changed:
+                return
+            body = json.dumps({
+                "updated": datetime.now(timezone.utc).isoformat(),
+                "listed": self.listed.isoformat(),
+                "files": [self._entries[name] for name in sorted(self._entries)],
+            }, separators=(",", ":"))
+            self.changed = False
+        upload.put_object(self.bucket, self.manifest_key, body, self.client,
+                          ContentType="application/json", CacheControl="no-cache")
@@ -0,0 +1,74 @@
+"""
+Resolve country names to ISO 3166-1 alpha-3 codes
+
+Names, official names, common names and codes of all countries known to
+pycountry are indexed once, together with any aliases supplied by the
+caller. Fuzzy search is only used for names missing from the index, and
+its results are kept in a bounded LRU cache.
+"""
+
+import logging
+from functools import lru_cache
+from typing import Any, Optional
+
+import pycountry
+
+INDEXED_ATTRIBUTES = ["alpha_2", "alpha_3", "name", "official_name", "common_name"]
+
+
+def build_index(aliases: Optional[dict[str, str]] = None) -> dict[str, str]:
+    "Returns mapping of lowercased country names and codes to ISO3 codes"
+    index = {}
+    for country in pycountry.countries:
+        for attribute in INDEXED_ATTRIBUTES:
+            if value := getattr(country, attribute, None):
+                index[value.lower()] = country.alpha_3
+    # aliases take precedence over pycountry names
+    index.update({name.lower(): iso3 for name, iso3 in (aliases or {}).items()})
+    return index
+
+
+class CountryResolver:
+    """Maps country names to ISO3 codes, returning an empty string if not found
+
+    Set fuzzy=False to only accept exact (case insensitive) matches.
+    """
+
+    def __init__(
+        self,
+        aliases: Optional[dict[str, str]] = None,
+        fuzzy: bool = True,
+        maxsize: int = 1024,
+    ):
+        self.index = build_index(aliases)
+        self.fuzzy = fuzzy
+        self.hits = 0
+        self.misses = 0
+        self.search = lru_cache(maxsize=maxsize)(self._search)
+
+    def __call__(self, country: Optional[str]) -> str:
+        if country is None:
+            return ""
+        if iso3 := self.index.get(country.strip().lower()):
+            self.hits += 1
+            return iso3
+        self.misses += 1
+        return self.search(country.strip())
+
+    def _search(self, country: str) -> str:
+        if not self.fuzzy:
+            logging.warning(f"No match found for country: {country}")
+            return ""
+        try:
+            matches = pycountry.countries.search_fuzzy(country)
+            if not matches:
+                logging.warning(f"No match found for country: {country}")
+                return ""
+        except Exception:
+            logging.exception(f"An exception occurred while trying to find an ISO country code for {country}")
+            return ""
+        return matches[0].alpha_3
+
+    def stats(self) -> dict[str, Any]:
+        "Returns index hits and misses, and fuzzy search cache statistics"
+        return {"hits": self.hits, "misses": self.misses, "search": self.search.cache_info()._asdict()}
@@ -0,0 +1,105 @@
+"""
+Hive partitioned Parquet dataset of the line list
+
+Cases are written to one Parquet file per country and month of
+confirmation, e.g. dataset/Country_ISO3=BRA/Confirmation_month=2022-08/part-0.parquet,
+so readers which understand Hive partitioning (pyarrow.dataset, DuckDB,
+arrow::open_dataset() in R) only read the files and columns a query
+needs. Cases without a country or confirmation date are in the
+__HIVE_DEFAULT_PARTITION__ of that column. Partition columns are only in
+the paths, as readers expect.
+
+A manifest, dataset/_manifest.json, lists the fields and each file with
+its partition values, rows, size and sha256. Files with the same hash as
+in the previous manifest are not uploaded again, and files of partitions
+without cases are deleted, so a run only uploads the partitions whose
+cases changed. Requires pyarrow.
+"""
+
+import json
+import hashlib
+import logging
+from datetime import datetime
+from typing import Any, Optional
+
+import pandas as pd
+from botocore.exceptions import ClientError
+
+import schema
+import upload
+
+DATASET_FOLDER = "dataset"
+MANIFEST_NAME = "_manifest.json"  # readers skip files starting with _
+PARTITION_COLUMNS = ["Country_ISO3", "Confirmation_month"]
+DEFAULT_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+CONTENT_TYPE = "application/vnd.apache.parquet"
+
+
+def partition_key(folder: str, values: tuple[str, ...]) -> str:
+    path = "/".join(f"{column}={value}" for column, value in zip(PARTITION_COLUMNS, values))
+    return f"{folder}/{path}/part-0.parquet"
+
+
+def partitions(df: pd.DataFrame, folder: str = DATASET_FOLDER) -> dict[str, tuple[tuple[str, ...], int, bytes]]:
+    """Returns partition values, number of cases and Parquet of cases of
+    each partition, by key, from a DataFrame from schema.to_dataframe()"""
+    values = [
+        df.Country_ISO3.astype("string").fillna(DEFAULT_PARTITION),
+        df.Date_confirmation.dt.strftime("%Y-%m").fillna(DEFAULT_PARTITION),
+    ]
+    # files share the types of schema.arrow_schema() whatever their values,
+    # and enumerations are strings, as categories of the whole line list
+    # would change every file when a category is added
+    cases = df.drop(columns=["Country_ISO3"])
+    return {
+        partition_key(folder, key): (key, len(group), schema.to_parquet(group))
+        for key, group in cases.groupby(values, sort=True)
+    }
+
+
+def manifest_key(folder: str) -> str:
+    return f"{folder}/{MANIFEST_NAME}"
+
+
+def read_manifest(bucket: str, folder: str = DATASET_FOLDER, client=None) -> Optional[dict[str, Any]]:
+    client = client or upload.S3_CLIENT
+    try:
+        body = client.get_object(Bucket=bucket, Key=manifest_key(folder))["Body"].read()
+    except ClientError as exc:
+        if exc.response.get("Error", {}).get("Code") in ["NoSuchKey", "404"]:
+            return None
+        raise
+    return json.loads(body)
+
+
+def publish(df: pd.DataFrame, bucket: str, folder: str = DATASET_FOLDER,
+            now: Optional[datetime] = None, client=None) -> dict[str, Any]:
+    """Stores line list as a partitioned dataset under bucket/folder, only
+    uploading changed partitions, and returns the new manifest"""
+    now = now or datetime.today()
+    files = partitions(df, folder)
+    previous = read_manifest(bucket, folder, client) or {"files": []}
+    previous_hashes = {f["key"]: f["sha256"] for f in previous["files"]}
+    manifest = {
+        "updated": str(now),
+        "fields": [name for name in schema.FIELDS if name != "Country_ISO3"],
+        "partitioning": PARTITION_COLUMNS,
+        "files": [],
+    }
+    changed = {}
+    for key, (values, rows, body) in files.items():
+        sha256 = hashlib.sha256(body).hexdigest()
+        manifest["files"].append({
+            "key": key, **dict(zip(PARTITION_COLUMNS, values)),
+            "rows": rows, "size": len(body), "sha256": sha256,
+        })
+        if previous_hashes.get(key) != sha256:
+            changed[(bucket, key)] = body
+    stale = sorted(set(previous_hashes) - set(files))
+    logging.info(f"Uploading {len(changed)} of {len(files)} dataset partitions, deleting {len(stale)}")
+    upload.put_objects(changed, extra_args={k: {"ContentType": CONTENT_TYPE} for k in changed}, client=client)
+    # manifest is written last, so it never lists files which are not stored yet
+    upload.put_object(bucket, manifest_key(folder), json.dumps(manifest), client, ContentType="application/json")
+    if stale:
+        upload.delete_objects(bucket, stale, client)
+    return manifest
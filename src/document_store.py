@@ -0,0 +1,177 @@
+"""
+Store of archived documents (source PDFs, case definitions)
+
+Each distinct document is uploaded once, to its name in the folder. A
+manifest at <folder>/.manifest.json maps each URL to its name, the sha256
+of the fetched content (the PDF, or HTML of rendered web pages) and the
+ETag and Last-Modified headers of the response, which are used to skip
+unchanged documents with conditional requests. URLs whose server sends
+neither header are fetched again once their copy is older than MAX_AGE,
+and only stored again if their content hash changed.
+
+Manifest entries are also a lookup of stored content by sha256: a URL
+whose content is already stored under another name is not uploaded, and
+its entry points at that object ("stored_as"), as does its entry in the
+folder's index, which s3_ui resolves. Before an object is replaced, it
+is copied within S3 to the names pointing at it.
+"""
+
+import json
+import hashlib
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Optional
+
+from botocore.exceptions import ClientError
+
+import upload
+
+MANIFEST_NAME = ".manifest.json"
+MAX_AGE = timedelta(days=30)
+CHUNK_SIZE = 1024 * 1024
+
+Entry = dict[str, Any]  # name, sha256, fetched, ETag / Last-Modified if sent, adopted, stored_as
+
+
+def file_hash(path: str) -> str:
+    "Returns SHA-256 hex digest of file at path"
+    digest = hashlib.sha256()
+    with open(path, "rb") as fp:
+        while chunk := fp.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DocumentStore:
+    def __init__(self, bucket: str, folder: str, client=None):
+        self.bucket = bucket
+        self.folder = folder
+        self.client = client or upload.S3_CLIENT
+        self.lock = threading.Lock()
+        self.changed = False
+        self._manifest: Optional[dict[str, Entry]] = None
+        self.names: dict[str, str] = {}  # sha256 -> name of object with that content
+
+    @property
+    def manifest_key(self) -> str:
+        return f"{self.folder}/{MANIFEST_NAME}"
+
+    @property
+    def manifest(self) -> dict[str, Entry]:
+        with self.lock:
+            if self._manifest is None:
+                self._manifest = self.read_manifest()
+                self.names = {e["sha256"]: e["name"] for e in self._manifest.values()
+                              if e.get("sha256") and "stored_as" not in e}
+            return self._manifest
+
+    def read_manifest(self) -> dict[str, Entry]:
+        try:
+            body = self.client.get_object(Bucket=self.bucket, Key=self.manifest_key)["Body"].read()
+        except ClientError as exc:
+            if exc.response.get("Error", {}).get("Code") in ["NoSuchKey", "404"]:
+                return {}
+            raise
+        return json.loads(body)
+
+    def validators(self, url: str, name: str) -> dict[str, Any]:
+        "Returns ETag, Last-Modified, sha256 and whether adopted of the copy of url stored as name"
+        entry = self.manifest.get(url, {})
+        if entry.get("name") != name:
+            return {}
+        return {key: entry[key] for key in ["ETag", "Last-Modified", "sha256", "adopted"] if key in entry}
+
+    def needs_fetch(self, url: str, name: str, now: Optional[datetime] = None) -> bool:
+        """Returns whether url should be fetched: it is new, stored under
+        another name, can be checked with a conditional request, or its
+        stored copy is older than MAX_AGE"""
+        entry = self.manifest.get(url)
+        if entry is None or entry["name"] != name or "ETag" in entry or "Last-Modified" in entry:
+            return True
+        return datetime.fromisoformat(entry["fetched"]) < (now or datetime.today()) - MAX_AGE
+
+    def adopt(self, url: str, name: str, now: Optional[datetime] = None):
+        "Records an existing object stored under name before there was a manifest"
+        manifest = self.manifest
+        with self.lock:
+            manifest[url] = {"name": name, "fetched": str(now or datetime.today()), "adopted": True}
+            self.changed = True
+
+    def stored_as(self, sha256: Optional[str], name: str) -> Optional[str]:
+        "Returns name of another object with content sha256, if any"
+        self.manifest  # reads names of stored content
+        with self.lock:
+            other = self.names.get(sha256)
+        return other if other != name else None
+
+    def record(self, url: str, name: str, validators: dict[str, str], now: Optional[datetime] = None) -> str:
+        """Records validators and content hash of url, fetched again with the
+        same content as its copy stored as name, or as another object with
+        the same content. Returns name of the object with its content."""
+        manifest = self.manifest
+        sha256 = validators.get("sha256")
+        with self.lock:
+            other = self.names.get(sha256)
+            if other is None and sha256:
+                self.names[sha256] = name
+            elif other == name:
+                other = None
+            manifest[url] = {
+                "name": name, "fetched": str(now or datetime.today()), **validators,
+                **({"stored_as": other} if other else {}),
+            }
+            self.changed = True
+        return other or name
+
+    def store(self, url: str, name: str, path: str, validators: dict[str, str], now: Optional[datetime] = None) -> str:
+        """Stores document at path, fetched from url, as folder/name, unless
+        its content is already stored as another object. Returns name of
+        the object with its content."""
+        manifest = self.manifest
+        # pages rendered without being fetched first have no content hash
+        validators = {**validators, "sha256": validators.get("sha256") or file_hash(path)}
+        sha256 = validators["sha256"]
+        with self.lock:
+            other = self.names.get(sha256)
+            if other is None or other == name:
+                # content is being stored as name, from now on
+                self.names = {h: n for h, n in self.names.items() if n != name}
+                self.names[sha256] = name
+                dependents = {u: e for u, e in manifest.items() if e.get("stored_as") == name and u != url}
+        if other is not None and other != name:
+            logging.info(f"Content of {url} already stored as {other}")
+            return self.record(url, name, validators, now)
+        # names pointing at the object keep its current content, copied once
+        # within S3 to the first of them, which the others then point at
+        copy = None
+        for dependent_url, entry in dependents.items():
+            if copy is None:
+                copy = entry["name"]
+                upload.copy_object(self.bucket, f"{self.folder}/{copy}", (self.bucket, f"{self.folder}/{name}"),
+                                   self.client)
+            with self.lock:
+                manifest[dependent_url] = {
+                    **{k: v for k, v in entry.items() if k != "stored_as"},
+                    **({"stored_as": copy} if entry["name"] != copy else {}),
+                }
+                if entry.get("sha256"):
+                    self.names[entry["sha256"]] = copy
+        with open(path, "rb") as fp:
+            upload.put_object(self.bucket, f"{self.folder}/{name}", fp, self.client, ContentType="application/pdf")
+        return self.record(url, name, validators, now)
+
+    def aliases(self) -> dict[str, str]:
+        "Returns name of the object stored for each name without its own object"
+        manifest = self.manifest
+        with self.lock:
+            return {e["name"]: e["stored_as"] for e in manifest.values() if "stored_as" in e}
+
+    def save(self):
+        "Writes manifest if it changed since it was read"
+        with self.lock:
+            if not self.changed:
+                return
+            body = json.dumps(self._manifest, indent=1, sort_keys=True)
+            self.changed = False
+        upload.put_object(self.bucket, self.manifest_key, body, self.client, ContentType="application/json")
@@ -1,18 +1,27 @@
 """
 Fetch ECDC data and parse as CSV
+
+The report page is downloaded once, and the JSON embedded in a script of
+every target div is extracted in one incremental scan of the HTML, without
+building a document tree. Divs the scan cannot handle (not closed where
+they were opened, or whose script is not JSON) are found with
+BeautifulSoup instead.
 """
 
 import io
 import re
 import csv
 import json
+import logging
 from enum import Enum
+from html.parser import HTMLParser
 from itertools import repeat
 from typing import Optional
 
-import requests
 from bs4 import BeautifulSoup
 
+import http_cache
+
 URL = "https://monkeypoxreport.ecdc.europa.eu"
 ONSET_OCA_DIV_ID = "by-date-of-onset-and-by-country-or-area"
 ONSET_OCA_FIELDS = ["date", "country", "count"]
@@ -32,6 +41,8 @@ REGEXES = {
     ONSET_DATE_DIV_ID: r"Date: (20\d\d-[0-1]\d-\d\d)<br />count:\s+(\d+)<br />TypeDate: (\w+)"
 }
 
+PATTERNS = {div: re.compile(regex) for div, regex in REGEXES.items()}
+
 FIELDS = {
     ONSET_OCA_DIV_ID: ONSET_OCA_FIELDS,
     NOTIF_DIV_ID: NOTIF_FIELDS,
@@ -39,11 +50,20 @@ FIELDS = {
 }
 
 
-def fetch_soup(url: str) -> str:
+def fetch_page(url: str = URL) -> bytes:
+    return http_cache.get(url).content
+
+
+def parse_soup(content: bytes) -> BeautifulSoup:
+    html = content.decode("utf-8")
     try:
-        return BeautifulSoup(requests.get(url).content.decode("utf-8"), "html5lib")
+        return BeautifulSoup(html, "html5lib")
     except Exception:
-        return BeautifulSoup(requests.get(url).content.decode("utf-8"), "html.parser")
+        return BeautifulSoup(html, "html.parser")
+
+
+def fetch_soup(url: str) -> BeautifulSoup:
+    return parse_soup(fetch_page(url))
 
 
 # Yep, that JSON contains HTML.
@@ -51,7 +71,7 @@ def parse_line(line: str, div: str) -> Optional[dict[str, str | int]]:
     """Returns comma separated values from line
     where line is of a form given in REGEXES.values()
     """
-    if match := re.match(REGEXES.get(div), line):
+    if match := PATTERNS[div].match(line):
         if div == ONSET_OCA_DIV_ID:
             date, count, country = match.groups()
             return {"date": date, "count": int(count), "country": country}
@@ -64,6 +84,66 @@ def parse_line(line: str, div: str) -> Optional[dict[str, str | int]]:
     return None
 
 
+class ScriptExtractor(HTMLParser):
+    """Collects text of the first script inside each of the target divs
+
+    The depth at which each target div opened is kept, and its script is
+    only collected once the div closes at that depth, so scripts of divs
+    which are never closed, or closed by a stray tag, are left out."""
+
+    def __init__(self, divs: list[str]):
+        super().__init__(convert_charrefs=True)
+        self.targets = set(divs)
+        self.depth = 0  # of enclosing divs
+        self.open: dict[str, int] = {}  # depth of each open target div
+        self.current: Optional[str] = None  # target div of script being read
+        self.found: dict[str, str] = {}  # scripts of open target divs
+        self.scripts: dict[str, str] = {}
+        self.chunks: list[str] = []
+
+    @property
+    def done(self) -> bool:
+        return self.targets <= set(self.scripts)
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "div":
+            self.depth += 1
+            div_id = dict(attrs).get("id")
+            if div_id in self.targets and div_id not in self.scripts and div_id not in self.open:
+                self.open[div_id] = self.depth
+        elif tag == "script" and self.current is None:
+            pending = [div for div in self.open if div not in self.found]
+            self.current = max(pending, key=self.open.get, default=None)
+            self.chunks = []
+
+    def handle_endtag(self, tag):
+        if tag == "div" and self.depth:
+            for div in [div for div, depth in self.open.items() if depth == self.depth]:
+                del self.open[div]
+                if div in self.found:
+                    self.scripts[div] = self.found.pop(div)
+            self.depth -= 1
+        elif tag == "script" and self.current is not None:
+            self.found[self.current] = "".join(self.chunks)
+            self.current = None
+
+    def handle_data(self, data):
+        if self.current is not None:
+            self.chunks.append(data)
+
+
+def extract_scripts(content: bytes, divs: list[str], chunk_size: int = 64 * 1024) -> dict[str, str]:
+    """Returns text of the first script in each div found in HTML content,
+    stopping as soon as all divs have been found and closed"""
+    parser = ScriptExtractor(divs)
+    html = content.decode("utf-8")
+    for start in range(0, len(html), chunk_size):
+        parser.feed(html[start:start + chunk_size])
+        if parser.done:
+            break
+    return parser.scripts
+
+
 def get_json_data(soup: str, div: str) -> dict[str]:
     html = soup.find("div", id=div)
     if html is None:
@@ -95,11 +175,7 @@ def to_csv(json_data: list[dict[str, str | int]], field_names: list[str]) -> str
     return buf.getvalue()
 
 
-def get_ecdc_data(
-    div: str, url: str = URL, output: Output = Output.CSV
-) -> str | list[dict[str, str | int]]:
-    json_soup = get_json_data(fetch_soup(URL), div=div)
-    data = process_json(json_soup, div)
+def format_data(data: list[dict[str, str | int]], div: str, output: Output = Output.CSV) -> str | list[dict[str, str | int]]:
     if output == Output.CSV:
         return to_csv(data, FIELDS[div])
     elif output == Output.JSON:
@@ -108,6 +184,29 @@ def get_ecdc_data(
         return data
 
 
+def get_all_ecdc_data(
+    divs: list[str] = TARGET_DIVS, url: str = URL, output: Output = Output.CSV, content: Optional[bytes] = None
+) -> dict[str, str | list[dict[str, str | int]]]:
+    "Returns data of each div, from one download of the page at url (or its content)"
+    content = content or fetch_page(url)
+    json_data = {}
+    for div, script in extract_scripts(content, divs).items():
+        try:
+            json_data[div] = json.loads(script)
+        except json.JSONDecodeError:
+            logging.warning(f"Script of div[id='{div}'] is not JSON, parsing the page with BeautifulSoup")
+    if missing := [div for div in divs if div not in json_data]:
+        soup = parse_soup(content)
+        json_data.update({div: get_json_data(soup, div=div) for div in missing})
+    return {div: format_data(process_json(json_data[div], div), div, output) for div in divs}
+
+
+def get_ecdc_data(
+    div: str, url: str = URL, output: Output = Output.CSV
+) -> str | list[dict[str, str | int]]:
+    return get_all_ecdc_data([div], url, output)[div]
+
+
 if __name__ == "__main__":
-    for div in TARGET_DIVS:
-        print(get_ecdc_data(div=div))
+    for data in get_all_ecdc_data().values():
+        print(data)
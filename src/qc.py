@@ -14,9 +14,10 @@ import math
 import yaml
 import datetime
 import logging
-from typing import Any, Optional
+from typing import Any, Callable, Optional
 
 import requests
+import numpy as np
 import pandas as pd
 
 
@@ -113,29 +114,138 @@ def validate_row(row: dict[str, Any]) -> Optional[list[dict[str, str]]]:
     return None
 
 
+# Same pattern as datetime.strptime(s, "%Y-%m-%d")
+DATE_REGEX = r"(\d\d\d\d)-(1[0-2]|0[1-9]|[1-9])-(3[01]|[12]\d|0[1-9]|[1-9]| [1-9])"
+DAYS_IN_MONTH = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+
+ColumnCheck = Callable[[pd.Series], np.ndarray]
+
+
+def empty_column(column: pd.Series) -> np.ndarray:
+    "Vectorized is_empty()"
+    return (column.isna() | (column == "")).to_numpy()
+
+
+def valid_date_column(column: pd.Series) -> np.ndarray:
+    "Vectorized valid_date()"
+    if column.dtype != object:
+        return np.zeros(len(column), dtype=bool)
+    parts = column.str.extract(f"^{DATE_REGEX}$").to_numpy(dtype=float, na_value=0)
+    year, month, day = parts.T
+    month = month.astype(int)
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    days = DAYS_IN_MONTH[np.clip(month - 1, 0, 11)] + ((month == 2) & leap)
+    return (column == "").to_numpy() | ((month > 0) & (year >= 1) & (day <= days))
+
+
+def valid_enum_column(values: list[str]) -> ColumnCheck:
+    "Vectorized valid_enum()"
+    values = [v.lower() for v in values]
+
+    def check(column: pd.Series) -> np.ndarray:
+        return column.astype(str).str.strip().str.lower().isin(values).to_numpy()
+
+    return check
+
+
+def valid_url_column(column: pd.Series) -> np.ndarray:
+    "Vectorized valid_url()"
+    if column.dtype != object:
+        return np.zeros(len(column), dtype=bool)
+    return column.str.startswith(("http://", "https://")).fillna(False).to_numpy(dtype=bool)
+
+
+def valid_iso3_column(column: pd.Series) -> np.ndarray:
+    if column.dtype != object:
+        return np.zeros(len(column), dtype=bool)
+    valid = column.str.isupper() & (column.str.len() == 3)
+    return valid.fillna(False).to_numpy(dtype=bool)
+
+
+def elementwise(check: Callable[[Any], bool]) -> ColumnCheck:
+    def column_check(column: pd.Series) -> np.ndarray:
+        return np.array([check(value) for value in column], dtype=bool)
+
+    return column_check
+
+
+def by_unique_value(check: ColumnCheck) -> ColumnCheck:
+    "Runs check once per distinct value of a column, columns have few of those"
+
+    def column_check(column: pd.Series) -> np.ndarray:
+        codes, uniques = pd.factorize(column)
+        missing = pd.Series([math.nan], dtype=object if column.dtype == object else float)
+        # missing values have code -1, which picks the last element
+        valid = np.append(check(pd.Series(uniques)), check(missing))
+        return valid[codes]
+
+    return column_check
+
+
+def valid_column(column: pd.Series) -> np.ndarray:
+    return np.ones(len(column), dtype=bool)
+
+
+def column_check(field_name: str, field_type: str) -> ColumnCheck:
+    "Returns vectorized equivalent of validate_field() for a column"
+    if "|" in field_type:
+        return by_unique_value(valid_enum_column(field_type.split(" | ")))
+    elif field_type == "integer":
+        return by_unique_value(elementwise(valid_int))
+    elif field_type == "iso8601date":
+        return by_unique_value(valid_date_column)
+    elif field_type == "url":
+        return by_unique_value(valid_url_column)
+    elif field_type == "integer-range":
+        return by_unique_value(elementwise(valid_integer_range))
+    elif field_name == "Country_ISO3":
+        return by_unique_value(valid_iso3_column)
+    else:
+        return valid_column
+
+
+column_checks = {name: column_check(name, field_type) for name, field_type in types.items()}
+
+
 def lint(df: pd.DataFrame) -> list[dict[str, Any]]:
+    columns = list(df.columns)
+    invalid = np.zeros((len(df), len(columns)), dtype=bool)
+    for i, field_name in enumerate(columns):
+        valid = column_checks[field_name](df[field_name])
+        if not required[field_name]:
+            valid = valid | empty_column(df[field_name])
+        invalid[:, i] = ~valid
+    row_invalid = (df.Status == "confirmed").to_numpy() & empty_column(df.Date_confirmation)
+
+    # only rows with errors are converted to records
+    error_lines = np.flatnonzero(row_invalid | invalid.any(axis=1))
+    rows = df.iloc[error_lines].to_dict("records")
     linting_result = []
-    line = 0
-    for row in df.to_dict("records"):
-        line += 1
-        invalid_fields = [
-            (field_name, value)
-            for field_name, value in row.items()
-            if not validate_field(
-                value, field_name, types[field_name], required[field_name]
+    for index, row in zip(error_lines, rows):
+        line = int(index) + 1
+        if row_invalid[index]:
+            linting_result.append(
+                {
+                    "id": row["ID"],
+                    "line": line,
+                    "errors": [
+                        {
+                            "field": "Date_confirmation",
+                            "value": "",
+                            "message": "Status=confirmed requires Date_confirmation",
+                        }
+                    ],
+                }
             )
-        ]
-        if row_errors := validate_row(row):
-            linting_result.append({"id": row["ID"], "line": line, "errors": row_errors})
-
-        if invalid_fields:
+        if invalid[index].any():
             linting_result.append(
                 {
                     "id": row["ID"],
                     "line": line,
                     "errors": [
-                        {"field": field_name, "value": value}
-                        for field_name, value in invalid_fields
+                        {"field": field_name, "value": row[field_name]}
+                        for field_name, is_invalid in zip(columns, invalid[index])
+                        if is_invalid
                     ],
                 }
             )
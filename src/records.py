@@ -0,0 +1,73 @@
+"""
+Compact records of the line list
+
+Each case is a Record: a slotted, read only mapping over a tuple of
+values, which shares one key index with every other case with the same
+keys (in practice, every case of a worksheet). Values of enumerated,
+date and country fields are interned, so each distinct value is stored
+once. A Record takes a fraction of the memory of a dict of the same items
+and can be used wherever a read only dict is, except that json.dumps()
+needs default=dict.
+"""
+
+import sys
+from collections.abc import Iterator, Mapping
+from typing import Any
+
+from schema import DATE_FIELDS, ENUM_FIELDS
+
+INTERNED_FIELDS = [*ENUM_FIELDS, *DATE_FIELDS, "Country", "Country_ISO3"]
+
+
+class Record(Mapping):
+    __slots__ = ("_index", "_values")
+
+    def __init__(self, index: dict[str, int], values: tuple[Any, ...]):
+        self._index = index
+        self._values = values
+
+    def __getitem__(self, key: str) -> Any:
+        return self._values[self._index[key]]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        i = self._index.get(key)
+        return default if i is None else self._values[i]
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._index
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._index)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __repr__(self) -> str:
+        return f"Record({dict(self)!r})"
+
+    def __reduce__(self):
+        return Record, (self._index, self._values)
+
+
+class RecordFactory:
+    "Makes records from mappings, sharing key indexes and interning values of INTERNED_FIELDS"
+
+    def __init__(self, interned_fields: list[str] = INTERNED_FIELDS):
+        self.interned_fields = set(interned_fields)
+        self.layouts: dict[tuple[str, ...], tuple[dict[str, int], list[int]]] = {}
+
+    def __call__(self, case: Mapping[str, Any]) -> Record:
+        return self.from_values(tuple(case), list(case.values()))
+
+    def from_values(self, keys: tuple[str, ...], values: list[Any]) -> Record:
+        "Returns record of keys and values, values may be modified"
+        if (layout := self.layouts.get(keys)) is None:
+            layout = self.layouts[keys] = (
+                {k: i for i, k in enumerate(keys)},
+                [i for i, k in enumerate(keys) if k in self.interned_fields],
+            )
+        index, interned = layout
+        for i in interned:
+            if type(values[i]) is str:
+                values[i] = sys.intern(values[i])
+        return Record(index, tuple(values))
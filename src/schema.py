@@ -0,0 +1,80 @@
+"""
+Tables of the line list, using fields and types from data_dictionary.yml
+
+from_records() builds a table of values as they are, with empty values
+missing, which is what quality checks run on. to_dataframe() types it:
+dates are parsed as dates, enumerations (e.g. confirmed | suspected) are
+categoricals, integers are nullable integers and all other fields are
+strings.
+"""
+
+import io
+from typing import Any
+
+import yaml
+import pandas as pd
+
+with open("data_dictionary.yml") as fp:
+    data_dictionary = yaml.safe_load(fp)
+    FIELDS = [f["name"] for f in data_dictionary["fields"]]
+    types = {f["name"]: f["type"] for f in data_dictionary["fields"]}
+
+DATE_FIELDS = [name for name, field_type in types.items() if field_type == "iso8601date"]
+ENUM_FIELDS = [name for name, field_type in types.items() if "|" in field_type]
+INTEGER_FIELDS = [name for name, field_type in types.items() if field_type == "integer"]
+
+
+def from_records(data: list[dict[str, Any]]) -> pd.DataFrame:
+    "Returns line list as a DataFrame with a column per field, and empty values missing"
+    df = pd.DataFrame(data, columns=FIELDS)
+    return df.mask(df.eq(""))
+
+
+def to_dataframe(data: list[dict[str, Any]] | pd.DataFrame) -> pd.DataFrame:
+    "Returns line list as a DataFrame with types from the data dictionary"
+    df = data.reindex(columns=FIELDS) if isinstance(data, pd.DataFrame) else from_records(data)
+    for name in FIELDS:
+        if name in DATE_FIELDS:
+            df[name] = pd.to_datetime(df[name], format="%Y-%m-%d", errors="coerce")
+        elif name in ENUM_FIELDS:
+            df[name] = df[name].astype("string").astype("category")
+        elif name in INTEGER_FIELDS:
+            numbers = pd.to_numeric(df[name], errors="coerce")
+            # non-integral values (e.g. 1.5 typed in a sheet) are missing, as unparseable ones
+            df[name] = numbers.where(numbers % 1 == 0).astype("Int64")
+        else:
+            df[name] = df[name].astype("string")
+    return df
+
+
+def arrow_schema(fields: list[str] = FIELDS):
+    """Returns Arrow schema of fields from the data dictionary, so every
+    Parquet file has the same types whatever values it has, requires pyarrow"""
+    import pyarrow as pa
+
+    def arrow_type(name: str):
+        if name in DATE_FIELDS:
+            return pa.date32()
+        if name in INTEGER_FIELDS:
+            return pa.int64()
+        return pa.string()  # enumerations too, Parquet dictionary encodes strings
+
+    return pa.schema([pa.field(name, arrow_type(name)) for name in fields])
+
+
+def to_parquet(data: list[dict[str, Any]] | pd.DataFrame) -> bytes:
+    """Returns line list (records or a DataFrame from to_dataframe(), with a
+    subset of FIELDS) as Parquet with the types of arrow_schema(), requires pyarrow"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    df = data.copy() if isinstance(data, pd.DataFrame) else to_dataframe(data)
+    for name in df.columns:
+        if name in DATE_FIELDS:
+            df[name] = df[name].dt.date
+        elif name in ENUM_FIELDS:
+            df[name] = df[name].astype("string")
+    table = pa.Table.from_pandas(df, schema=arrow_schema(list(df.columns)), preserve_index=False)
+    buf = io.BytesIO()
+    pq.write_table(table, buf)
+    return buf.getvalue()
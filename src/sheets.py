@@ -0,0 +1,64 @@
+"""
+Read worksheets of a Google Sheets spreadsheet
+
+The client is authorized once per process, and all requested worksheets
+are read with a single values.batchGet request, instead of opening the
+spreadsheet and reading each worksheet separately. Rows are returned as
+records with numbers converted, like Worksheet.get_all_records().
+"""
+
+import logging
+from functools import cache
+from typing import Any
+
+import pygsheets
+from googleapiclient.errors import HttpError
+from pygsheets.utils import numericise_all
+
+Records = list[dict[str, Any]]
+
+
+@cache
+def client() -> pygsheets.client.Client:
+    return pygsheets.authorize(service_account_env_var="GOOGLE_CREDENTIALS")
+
+
+def sheet_range(title: str) -> str:
+    "Returns A1 notation of all cells of the worksheet titled title"
+    return "'{}'".format(title.replace("'", "''"))
+
+
+def to_records(values: list[list[Any]], empty_value: Any = "") -> Records:
+    "Returns rows of values as records keyed by the first (header) row"
+    if not values:
+        return []
+    keys, rows = values[0], values[1:]
+    return [
+        dict(zip(keys, numericise_all((row + [""] * len(keys))[:len(keys)], empty_value)))
+        for row in rows
+    ]
+
+
+def get_ranges(document_id: str, ranges: list[str]) -> list[list[list[Any]]]:
+    "Returns cell values of each range (in A1 notation), from one batchGet request"
+    try:
+        value_ranges = client().sheet.values_batch_get(document_id, ranges)
+    except HttpError as exc:
+        # the API only reports that a range could not be parsed
+        if exc.resp.status == 400 and "Unable to parse range" in str(exc):
+            logging.error(f"Could not find all worksheets of ranges={ranges}")
+            raise pygsheets.WorksheetNotFound(str(exc)) from exc
+        raise
+    # value ranges are in the order requested
+    return [vr.get("values", []) for vr in value_ranges]
+
+
+def get_values(document_id: str, titles: list[str]) -> dict[str, list[list[Any]]]:
+    "Returns cell values of each worksheet, from one batchGet request"
+    logging.info(f"Getting worksheets {titles} from Google Sheets")
+    return dict(zip(titles, get_ranges(document_id, [sheet_range(t) for t in titles])))
+
+
+def get_records(document_id: str, titles: list[str]) -> dict[str, Records]:
+    "Returns rows of each worksheet as records"
+    return {title: to_records(values) for title, values in get_values(document_id, titles).items()}
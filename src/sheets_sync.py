@@ -0,0 +1,158 @@
+"""
+Incremental sync of a worksheet, using ID and Date_last_modified as a cursor
+
+A copy of the worksheet's values is stored in S3 after each run. The next
+run only reads the header row and the ID and Date_last_modified columns,
+then reads the rows whose Date_last_modified changed and the rows added
+after the previous last row, and updates the copy.
+
+The whole worksheet is read again if there is no copy yet, it is older
+than FULL_REFRESH_INTERVAL, the header changed, rows were removed or
+reordered (IDs differ at a previous position), or more than
+MAX_CHANGED_FRACTION of the rows changed. Edits which do not update
+Date_last_modified are only picked up by a full refresh.
+"""
+
+import re
+import gzip
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Optional
+
+from botocore.exceptions import ClientError
+
+import sheets
+import upload
+
+SYNC_FOLDER = "sheets-sync"
+FULL_REFRESH_INTERVAL = timedelta(days=7)
+MAX_CHANGED_FRACTION = 0.25
+CURSOR_FIELDS = ["ID", "Date_last_modified"]
+
+Values = list[list[Any]]
+
+
+def column_letter(index: int) -> str:
+    "Returns A1 notation of the column at 0-based index (0 -> A, 26 -> AA)"
+    letters = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord("A") + remainder) + letters
+    return letters
+
+
+def state_key(title: str) -> str:
+    return f"{SYNC_FOLDER}/{re.sub(r'[^A-Za-z0-9]+', '-', title).strip('-').lower()}.json.gz"
+
+
+def read_state(bucket: str, title: str, client=None) -> Optional[dict[str, Any]]:
+    client = client or upload.S3_CLIENT
+    try:
+        body = client.get_object(Bucket=bucket, Key=state_key(title))["Body"].read()
+    except ClientError as exc:
+        if exc.response.get("Error", {}).get("Code") in ["NoSuchKey", "404"]:
+            return None
+        raise
+    return json.loads(gzip.decompress(body))
+
+
+def write_state(bucket: str, title: str, state: dict[str, Any], client=None):
+    upload.put_object(
+        bucket, state_key(title), gzip.compress(json.dumps(state).encode("utf-8")), client,
+        ContentType="application/gzip",
+    )
+
+
+def padded(rows: Values, count: int) -> Values:
+    "Returns rows with empty rows appended up to count, as trailing empty rows are not returned"
+    return rows + [[] for _ in range(count - len(rows))]
+
+
+def cell(row: list[Any], index: int) -> Any:
+    return row[index] if index < len(row) else ""
+
+
+def row_ranges(title: str, indexes: list[int], width: int) -> list[tuple[int, int, str]]:
+    """Returns (start, end, A1 range) of consecutive runs of row indexes, where
+    index 0 is the first row after the header"""
+    runs = []
+    for i in sorted(indexes):
+        if runs and runs[-1][1] == i:
+            runs[-1][1] = i + 1
+        else:
+            runs.append([i, i + 1])
+    last = column_letter(width - 1)
+    return [
+        (start, end, f"{sheets.sheet_range(title)}!A{start + 2}:{last}{end + 1}")
+        for start, end in runs
+    ]
+
+
+def changed_rows(state: dict[str, Any], header: list[Any], columns: list[Values]) -> Optional[list[int]]:
+    """Returns indexes of rows to read, given current header and cursor
+    columns (including their header cell), or None if the stored copy
+    cannot be updated incrementally"""
+    if header != state["header"]:
+        logging.warning("Worksheet header changed")
+        return None
+    ids, modified = ([cell(r, 0) for r in column[1:]] for column in columns)
+    count = max(len(ids), len(modified))
+    ids, modified = ids + [""] * (count - len(ids)), modified + [""] * (count - len(modified))
+    previous = state["rows"]
+    if count < len(previous):
+        logging.warning(f"Worksheet has {count} rows, fewer than {len(previous)} in the last sync")
+        return None
+    id_index, modified_index = (header.index(name) for name in CURSOR_FIELDS)
+    changed = []
+    for i, row in enumerate(previous):
+        if str(cell(row, id_index)) != str(ids[i]):
+            logging.warning(f"Row {i + 2} has ID {ids[i]}, was {cell(row, id_index)} in the last sync")
+            return None
+        if str(cell(row, modified_index)) != str(modified[i]):
+            changed.append(i)
+    changed.extend(range(len(previous), count))
+    if len(changed) > MAX_CHANGED_FRACTION * count:
+        logging.info(f"{len(changed)} of {count} rows changed")
+        return None
+    return changed
+
+
+def sync(document_id: str, title: str, bucket: str, full: bool = False,
+         now: Optional[datetime] = None, client=None) -> Values:
+    """Returns values of worksheet (header first), reading only rows which
+    changed since the last sync where possible, and stores them for the
+    next sync"""
+    now = now or datetime.today()
+    state = None if full else read_state(bucket, title, client)
+    changed = None
+    if state is None:
+        logging.info(f"No previous sync of {title}, reading all rows")
+    elif datetime.fromisoformat(state["full_refresh"]) < now - FULL_REFRESH_INTERVAL:
+        logging.info(f"Last full sync of {title} was before {now - FULL_REFRESH_INTERVAL}, reading all rows")
+    elif any(name not in state["header"] for name in CURSOR_FIELDS):
+        logging.warning(f"{title} has no {CURSOR_FIELDS} columns, reading all rows")
+    else:
+        columns = [column_letter(state["header"].index(name)) for name in CURSOR_FIELDS]
+        header, *cursor_columns = sheets.get_ranges(
+            document_id,
+            [f"{sheets.sheet_range(title)}!1:1"] + [f"{sheets.sheet_range(title)}!{c}:{c}" for c in columns],
+        )
+        changed = changed_rows(state, header[0] if header else [], cursor_columns)
+
+    if changed is None:
+        values = sheets.get_values(document_id, [title])[title]
+        write_state(bucket, title, {"header": values[0] if values else [], "rows": values[1:],
+                                    "full_refresh": str(now), "synced": str(now)}, client)
+        return values
+
+    logging.info(f"Reading {len(changed)} changed rows of {title}")
+    rows = padded(state["rows"], len(state["rows"]) + sum(1 for i in changed if i >= len(state["rows"])))
+    ranges = row_ranges(title, changed, len(state["header"]))
+    if ranges:
+        for (start, end, _), values in zip(ranges, sheets.get_ranges(document_id, [r for *_, r in ranges])):
+            rows[start:end] = padded(values, end - start)
+    state.update(rows=rows, synced=str(now))
+    write_state(bucket, title, state, client)
+    return [state["header"]] + rows
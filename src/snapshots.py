@@ -0,0 +1,174 @@
+"""
+Delta encoded snapshots of the line list
+
+Each run stores the rows which were added, modified or omitted since the
+previous run, keyed on ID, and a full base snapshot every BASE_INTERVAL
+runs. The line list as of any time is rebuilt from the latest base before
+then and the deltas that follow it.
+
+Rows are compared by content rather than by Date_last_modified, as rows
+can be edited without updating it.
+
+Usage:
+    python snapshots.py rebuild "2022-08-01 12:00" > line-list.csv
+    python snapshots.py changes 2022-08-01 2022-08-08
+"""
+
+import csv
+import sys
+import gzip
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Any, Iterator, Mapping, Optional
+
+import boto3
+import click
+
+from schema import FIELDS
+
+Data = list[Mapping[str, Any]]
+Delta = dict[str, Any]
+
+DATA_BUCKET = os.environ.get("DATA_BUCKET")
+SNAPSHOTS_FOLDER = "snapshots"
+BASE = "base"
+DELTA = "delta"
+BASE_INTERVAL = 30  # runs
+
+S3 = boto3.resource("s3")
+
+
+def diff(previous: Data, current: Data) -> Delta:
+    "Returns rows added, modified and omitted (IDs only) in current"
+    previous_rows = {row["ID"]: row for row in previous}
+    current_ids = set()
+    added, modified = [], []
+    for row in current:
+        current_ids.add(row["ID"])
+        if (previous_row := previous_rows.get(row["ID"])) is None:
+            added.append(row)
+        elif previous_row != row:
+            modified.append(row)
+    omitted = [id_ for id_ in previous_rows if id_ not in current_ids]
+    return {"added": added, "modified": modified, "omitted": omitted}
+
+
+def apply(data: Data, delta: Delta) -> Data:
+    "Returns data with delta applied, added rows are appended"
+    rows = {row["ID"]: row for row in data}
+    for row in delta["modified"]:
+        rows[row["ID"]] = row
+    for id_ in delta["omitted"]:
+        rows.pop(id_, None)
+    for row in delta["added"]:
+        rows[row["ID"]] = row
+    return list(rows.values())
+
+
+def snapshot_key(timestamp: datetime, kind: str) -> str:
+    return f"{SNAPSHOTS_FOLDER}/{timestamp}-{kind}.json.gz"
+
+
+def parse_key(key: str) -> tuple[datetime, str]:
+    "Returns timestamp and kind (base or delta) of a snapshot key"
+    name = key.removeprefix(f"{SNAPSHOTS_FOLDER}/").removesuffix(".json.gz")
+    timestamp, kind = name.rsplit("-", 1)
+    return datetime.fromisoformat(timestamp), kind
+
+
+def list_snapshots(bucket: str) -> list[tuple[datetime, str]]:
+    "Returns (timestamp, kind) of stored snapshots in chronological order"
+    objects = S3.Bucket(bucket).objects.filter(Prefix=f"{SNAPSHOTS_FOLDER}/")
+    return sorted(parse_key(o.key) for o in objects if o.key.endswith(".json.gz"))
+
+
+def read_snapshot(bucket: str, timestamp: datetime, kind: str) -> Data | Delta:
+    body = S3.Object(bucket, snapshot_key(timestamp, kind)).get()["Body"].read()
+    return json.loads(gzip.decompress(body))
+
+
+def write_snapshot(bucket: str, timestamp: datetime, kind: str, snapshot: Data | Delta):
+    S3.Object(bucket, snapshot_key(timestamp, kind)).put(
+        Body=gzip.compress(json.dumps(snapshot, default=dict).encode("utf-8")),
+        ContentType="application/gzip",
+    )
+
+
+def rebuild(bucket: str, timestamp: Optional[datetime] = None) -> Data:
+    "Returns line list as of timestamp (default: latest)"
+    snapshots = [s for s in list_snapshots(bucket) if timestamp is None or s[0] <= timestamp]
+    bases = [t for t, kind in snapshots if kind == BASE]
+    if not bases:
+        raise ValueError(f"No base snapshot found before {timestamp}")
+    data = read_snapshot(bucket, bases[-1], BASE)
+    for t, kind in snapshots:
+        if kind == DELTA and t > bases[-1]:
+            data = apply(data, read_snapshot(bucket, t, DELTA))
+    return data
+
+
+def changes(bucket: str, start: datetime, end: datetime) -> Iterator[tuple[datetime, str, dict[str, Any]]]:
+    """Yields (timestamp, change, row) for rows added, modified or omitted
+    after start and up to end, reading one delta at a time. Omitted rows
+    only contain the ID."""
+    for t, kind in list_snapshots(bucket):
+        if kind == DELTA and start < t <= end:
+            delta = read_snapshot(bucket, t, DELTA)
+            for change in ["added", "modified"]:
+                for row in delta[change]:
+                    yield t, change, row
+            for id_ in delta["omitted"]:
+                yield t, "omitted", {"ID": id_}
+
+
+def store_snapshot(bucket: str, data: Data, now: Optional[datetime] = None):
+    """Stores delta from the latest snapshot, and a base snapshot if there is
+    none yet or BASE_INTERVAL deltas have been stored since the last one"""
+    logging.info("Storing line list snapshot")
+    now = now or datetime.today()
+    snapshots = list_snapshots(bucket)
+    bases = [t for t, kind in snapshots if kind == BASE]
+    if bases:
+        delta = diff(rebuild(bucket), data)
+        logging.info(
+            f"Snapshot delta: {len(delta['added'])} added, "
+            f"{len(delta['modified'])} modified, {len(delta['omitted'])} omitted"
+        )
+        write_snapshot(bucket, now, DELTA, delta)
+    deltas_since_base = [t for t, kind in snapshots if kind == DELTA and bases and t > bases[-1]]
+    if not bases or len(deltas_since_base) + 1 >= BASE_INTERVAL:
+        write_snapshot(bucket, now, BASE, data)
+
+
+@click.group()
+@click.option("--bucket", default=DATA_BUCKET, show_default=True, help="Bucket containing snapshots")
+@click.pass_context
+def cli(ctx, bucket):
+    ctx.obj = bucket
+
+
+@cli.command("rebuild")
+@click.argument("timestamp", type=datetime.fromisoformat, required=False)
+@click.pass_obj
+def rebuild_command(bucket, timestamp):
+    "Writes line list as of TIMESTAMP (default: latest) as CSV to stdout"
+    writer = csv.DictWriter(sys.stdout, fieldnames=FIELDS)
+    writer.writeheader()
+    for row in rebuild(bucket, timestamp):
+        writer.writerow(row)
+
+
+@cli.command("changes")
+@click.argument("start", type=datetime.fromisoformat)
+@click.argument("end", type=datetime.fromisoformat, required=False)
+@click.pass_obj
+def changes_command(bucket, start, end):
+    "Writes rows changed after START up to END (default: now) as JSON lines"
+    for t, change, row in changes(bucket, start, end or datetime.today()):
+        print(json.dumps({"timestamp": str(t), "change": change, "row": row}))
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,58 @@
+import io
+import json
+
+import pandas as pd
+import pytest
+
+import aggregates
+import schema
+
+CASES = [
+    {"Country": "England", "Country_ISO3": "GBR", "Status": "confirmed", "Gender": "male",
+     "Age": "20-25", "Date_confirmation": "2022-05-01"},
+    {"Country": "England", "Country_ISO3": "GBR", "Status": "confirmed", "Gender": "male",
+     "Age": "20-29", "Date_confirmation": "2022-05-01"},
+    {"Country": "Spain", "Country_ISO3": "ESP", "Status": "suspected", "Gender": "female",
+     "Age": "25-34", "Outcome": "recovered"},
+    {"Country": "Spain", "Country_ISO3": "ESP", "Status": "discarded", "Age": ">85"},
+]
+
+
+@pytest.mark.parametrize(
+    "age,band",
+    [("20-25", "20-29"), ("<5", "0-9"), (">85", "80+"), ("34", "30-39"),
+     ("25-34", None), (">75", None), ("30-20", None), ("<5-6", None), ("", None), (None, None)],
+)
+def test_age_band(age, band):
+    result = aggregates.age_band(pd.Series([age], dtype="string"))[0]
+    assert result == band if band else pd.isna(result)
+
+
+def test_cube():
+    cube = aggregates.cube(schema.to_dataframe(CASES))
+    assert len(cube) == 3 and cube["count"].sum() == len(CASES)
+    first = cube.iloc[0]
+    assert (first.Country_ISO3, first.Age_band, first["count"]) == ("GBR", "20-29", 2)
+    assert first.Date_confirmation == pd.Timestamp("2022-05-01")
+    assert pd.isna(cube.iloc[1].Date_confirmation) and pd.isna(cube.iloc[2].Gender)
+
+
+def test_summary():
+    summary = aggregates.summary(aggregates.cube(schema.to_dataframe(CASES)))
+    assert summary["total"] == 3
+    assert summary["by"]["Country_ISO3"] == {"ESP": 1, "GBR": 2}
+    assert summary["by"]["Status"] == {"confirmed": 2, "discarded": 1, "suspected": 1}
+    assert summary["by"]["Age_band"] == {"": 1, "20-29": 2}
+    assert summary["by"]["Outcome"] == {"": 2, "recovered": 1}
+    assert summary["by"]["Date_confirmation"] == {"": 1, "2022-05-01": 2}
+
+
+def test_cube_formats():
+    cube = aggregates.cube(schema.to_dataframe(CASES))
+    records = json.loads(aggregates.to_json(cube))
+    assert records[0] == {"Country": "England", "Country_ISO3": "GBR", "Status": "confirmed",
+                          "Gender": "male", "Age_band": "20-29", "Outcome": None,
+                          "Date_confirmation": "2022-05-01", "count": 2}
+    pytest.importorskip("pyarrow")
+    df = pd.read_parquet(io.BytesIO(aggregates.to_parquet(cube)))
+    assert df["count"].tolist() == cube["count"].tolist()
@@ -1,8 +1,11 @@
+import gzip
 import json
 import pytest
 from pprint import pprint
 
 import app
+import bucket_index
+import schema
 
 CLEANED_OUTPUT = [
     {
@@ -102,6 +105,14 @@ def test_clean_data():
     assert app.clean_data(input_data, id_prefix="N") == CLEANED_OUTPUT
 
 
+def test_clean_data_keeps_key_order():
+    input_data = [{"Status": "confirmed", "ID": 1, "Notes": "example note", "Country": "England"}, {"ID": 2}]
+    assert [list(case) for case in app.clean_data(input_data, id_prefix="E")] == [
+        ["Status", "ID", "Country", "Country_ISO3"],
+        ["ID", "Country_ISO3"],
+    ]
+
+
 def test_format_data():
     expected_JSON = json.dumps(CLEANED_OUTPUT)
     expected_CSV = """ID,Date_confirmation,Country,Country_ISO3,Status
@@ -131,3 +142,35 @@ def test_aggregate_data():
         expected_total,
         expected_country_aggregate,
     )
+
+
+def test_aggregate_data_typed():
+    df = schema.to_dataframe(CLEANED_OUTPUT)
+    assert app.aggregate_data(df, today="2022-06-05") == app.aggregate_data(CLEANED_OUTPUT, today="2022-06-05")
+
+
+def test_aggregate_data_missing_country():
+    with pytest.raises(ValueError, match="No country found"):
+        app.aggregate_data([{"ID": "N1", "Country_ISO3": "", "Status": "confirmed"}])
+
+
+def test_spool_data():
+    json_data, csv_data = app.spool_data(CLEANED_OUTPUT)
+    assert (json_data.read().decode("utf-8"), csv_data.read().decode("utf-8")) == app.format_data(CLEANED_OUTPUT)
+    # hashed while spooled, for the bucket index
+    assert bucket_index.describe(csv_data) == bucket_index.describe(app.format_data(CLEANED_OUTPUT)[1])
+
+
+def test_spool_data_ndjson():
+    json_data, _ = app.spool_data(CLEANED_OUTPUT, ndjson=True)
+    assert [json.loads(line) for line in json_data] == CLEANED_OUTPUT
+
+
+def test_format_archives():
+    json_data, csv_data = app.spool_data(CLEANED_OUTPUT)
+    archives = app.format_archives(CLEANED_OUTPUT, json_data, csv_data, ["csv.gz", "json.gz"])
+    csv_data.seek(0)
+    assert gzip.decompress(archives["csv.gz"].read()) == csv_data.read()
+    assert gzip.decompress(archives["json.gz"].read()).decode("utf-8") == json.dumps(CLEANED_OUTPUT)
+    # stored as compressed files, which clients would otherwise decompress on download
+    assert not any("ContentEncoding" in extra_args for extra_args in app.ARCHIVE_FORMATS.values())
@@ -0,0 +1,109 @@
+import hashlib
+import threading
+import time
+
+import pytest
+
+import archiver
+
+
+def test_host_lanes():
+    lanes = archiver.host_lanes({"1": "http://a.org/x", "2": "http://A.org/y", "3": "http://b.org/x"}, 2)
+    a, b = [("1", "http://a.org/x"), ("2", "http://A.org/y")], [("3", "http://b.org/x")]
+    assert lanes == [a, b, a]
+    assert lanes[2] is lanes[0]  # lanes of a host share its URLs
+
+
+def test_archive_urls(monkeypatch):
+    active, max_active = {}, {}
+    lock = threading.Lock()
+
+    def archive(url, path, previous=None, stored=lambda sha256: False):
+        host = url.split("/")[2]
+        with lock:
+            active[host] = active.get(host, 0) + 1
+            max_active[host] = max(max_active.get(host, 0), active[host])
+        time.sleep(0.01)
+        with lock:
+            active[host] -= 1
+        if "fail" in url:
+            raise OSError("failed")
+        if "same" in url:
+            return {"sha256": "1"}, False
+        return None if previous else ({"ETag": url}, True)
+
+    monkeypatch.setattr(archiver, "archive", archive)
+    targets = {f"{host}-{i}.pdf": f"http://{host}/{i}" for host in ["a.org", "b.org"] for i in range(5)}
+    targets["fail.pdf"] = "http://c.org/fail"
+    targets["unchanged.pdf"] = "http://c.org/unchanged"
+    targets["same.pdf"] = "http://c.org/same"
+    stored, recorded = [], []
+    archived = archiver.archive_urls(
+        targets,
+        lambda path, url, validators: stored.append((path, validators["ETag"])),
+        previous={"unchanged.pdf": {"ETag": "1"}},
+        max_workers=8,
+        max_per_host=2,
+        on_unchanged=lambda path, url, validators: recorded.append(path),
+    )
+    assert sorted(archived) == sorted(set(targets) - {"fail.pdf", "unchanged.pdf", "same.pdf"})
+    assert recorded == ["same.pdf"]
+    assert sorted(stored) == sorted((path, targets[path]) for path in archived)
+    assert max_active["a.org"] <= 2 and max_active["b.org"] <= 2
+
+
+def test_conditional_headers():
+    assert archiver.conditional_headers({"ETag": '"abc"', "Last-Modified": "Wed, 01 Jun 2022 00:00:00 GMT"}) == {
+        "If-None-Match": '"abc"',
+        "If-Modified-Since": "Wed, 01 Jun 2022 00:00:00 GMT",
+    }
+    assert archiver.conditional_headers(None) == {}
+
+
+class FakeResponse:
+    def __init__(self, content, status_code=200, headers=None):
+        self.content = content
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        pass
+
+
+def test_archive_renders_changed_pages(monkeypatch, tmp_path):
+    pages = {"http://a.org/": b"<html><head></head><body>a</body></html>"}
+    monkeypatch.setattr(archiver.SESSION, "get", lambda url, timeout, headers: FakeResponse(pages[url], 200, {"ETag": "1"}))
+    rendered = []
+    monkeypatch.setattr(archiver, "render_pdf", lambda url, path, html=None: rendered.append(html))
+    sha256 = hashlib.sha256(pages["http://a.org/"]).hexdigest()
+    path = str(tmp_path / "a.pdf")
+
+    assert archiver.archive("http://a.org/", path) == ({"ETag": "1", "sha256": sha256}, True)
+    assert rendered == [pages["http://a.org/"]]  # from the fetched page, not fetched again
+    assert archiver.archive("http://a.org/", path, {"ETag": "0", "sha256": sha256}) == ({"ETag": "1", "sha256": sha256}, False)
+    assert archiver.archive("http://a.org/", path, {"adopted": True}) == ({"ETag": "1", "sha256": sha256}, False)
+    # the same content fetched from another URL is already stored
+    assert archiver.archive("http://a.org/", path, stored={sha256}.__contains__) == ({"ETag": "1", "sha256": sha256}, False)
+    assert len(rendered) == 1
+
+
+def test_with_base():
+    assert archiver.with_base(b"<html><HEAD lang='en'><title>", "http://a.org/?a&b") == (
+        b"<html><HEAD lang='en'><base href=\"http://a.org/?a&amp;b\"><title>"
+    )
+    assert archiver.with_base(b"<p>", "http://a.org/") == b'<base href="http://a.org/"><p>'
+
+
+def test_archive_urls_raises_callback_failures(monkeypatch):
+    monkeypatch.setattr(archiver, "archive", lambda url, path, previous=None, stored=None: ({}, True))
+    stored = []
+
+    def on_archived(path, url, validators):
+        if path == "b.pdf":
+            raise OSError("upload failed")
+        stored.append(path)
+
+    targets = {"a.pdf": "http://a.org/a", "b.pdf": "http://a.org/b", "c.pdf": "http://b.org/c"}
+    with pytest.raises(OSError, match="upload failed"):
+        archiver.archive_urls(targets, on_archived, max_workers=1, max_per_host=1)
+    assert sorted(stored) == ["a.pdf", "c.pdf"]
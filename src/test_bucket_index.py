@@ -0,0 +1,111 @@
+import io
+import json
+from datetime import datetime, timezone
+
+from botocore.exceptions import ClientError
+
+import bucket_index
+
+
+MODIFIED = datetime(2022, 8, 1, tzinfo=timezone.utc)
+
+
+class FakePaginator:
+    def __init__(self, client):
+        self.client = client
+
+    def paginate(self, Bucket, Prefix):
+        self.client.listings += 1
+        keys = sorted(k for b, k in self.client.objects if b == Bucket and k.startswith(Prefix))
+        for i in range(0, len(keys), 2):
+            yield {"Contents": [
+                {"Key": k, "Size": len(self.client.objects[(Bucket, k)]), "LastModified": MODIFIED}
+                for k in keys[i:i + 2]
+            ]}
+
+
+class FakeClient:
+    def __init__(self, objects):
+        self.objects = objects
+        self.listings = 0
+
+    def get_paginator(self, name):
+        assert name == "list_objects_v2"
+        return FakePaginator(self)
+
+    def get_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise ClientError({"Error": {"Code": "NoSuchKey"}}, "GetObject")
+        return {"Body": io.BytesIO(self.objects[(Bucket, Key)])}
+
+    def upload_fileobj(self, fileobj, bucket, key, ExtraArgs=None, Config=None):
+        self.objects[(bucket, key)] = fileobj.read()
+
+
+def test_bucket_index():
+    client = FakeClient({
+        ("bucket", "sources/a.pdf"): b"",
+        ("bucket", "sources/b.pdf"): b"",
+        ("bucket", "sources/nested/c.pdf"): b"",
+        ("bucket", "archives/d.csv"): b"",
+    })
+    index = bucket_index.BucketIndex("bucket", "sources", client)
+    assert "a.pdf" in index and "b.pdf" in index
+    assert "c.pdf" not in index and "d.csv" not in index
+    index.add_object("e.pdf", b"%PDF", MODIFIED)
+    index.save()
+    manifest = json.loads(client.objects[("bucket", "sources/.index.json")])
+    assert manifest["files"] == [
+        {"name": "a.pdf", "size": 0, "last_modified": "2022-08-01T00:00:00+00:00"},
+        {"name": "b.pdf", "size": 0, "last_modified": "2022-08-01T00:00:00+00:00"},
+        {"name": "e.pdf", "size": 4, "last_modified": "2022-08-01T00:00:00+00:00",
+         "sha256": "315d429b7714cedb6ad04ac31240145257692630457f3c88253c5beceac76027"},
+    ]
+
+    # later runs read the manifest instead of listing the folder
+    index = bucket_index.BucketIndex("bucket", "sources", client)
+    assert "e.pdf" in index and ".index.json" not in index
+    assert client.listings == 1
+
+
+def test_bucket_index_lists_folder_for_manifest_of_names():
+    client = FakeClient({
+        ("bucket", "sources/a.pdf"): b"",
+        ("bucket", "sources/.index.json"): b'["a.pdf"]',
+    })
+    index = bucket_index.BucketIndex("bucket", "sources", client)
+    assert index.entries["a.pdf"]["size"] == 0 and client.listings == 1
+
+
+def test_bucket_index_lists_folder_again_once_stale():
+    client = FakeClient({("bucket", "sources/a.pdf"): b""})
+    index = bucket_index.BucketIndex("bucket", "sources", client)
+    assert "a.pdf" in index
+    index.save()
+    client.objects[("bucket", "sources/b.pdf")] = b"uploaded by hand"
+
+    index = bucket_index.BucketIndex("bucket", "sources", client)
+    assert "b.pdf" not in index and client.listings == 1
+
+    manifest = json.loads(client.objects[("bucket", "sources/.index.json")])
+    manifest["listed"] = (datetime.now(timezone.utc) - bucket_index.REFRESH_INTERVAL * 2).isoformat()
+    client.objects[("bucket", "sources/.index.json")] = json.dumps(manifest).encode()
+    index = bucket_index.BucketIndex("bucket", "sources", client)
+    assert "b.pdf" in index and client.listings == 2
+
+
+def test_describe():
+    spool = bucket_index.HashingSpool()
+    spool.write(b"%PDF")
+    assert bucket_index.describe(spool) == bucket_index.describe(b"%PDF") == bucket_index.describe("%PDF")
+    assert spool.tell() == 0
+    assert bucket_index.describe(io.BytesIO(b"%PDF")) == (4, None)  # not read again to hash it
+
+
+def test_bucket_index_aliases():
+    client = FakeClient({("bucket", "sources/a.pdf"): b"%PDF"})
+    index = bucket_index.BucketIndex("bucket", "sources", client)
+    index.set_aliases({"b.pdf": "a.pdf"})
+    assert index.entries["b.pdf"] == {**index.entries["a.pdf"], "name": "b.pdf", "key": "a.pdf"}
+    index.set_aliases({})
+    assert "key" not in index.entries["b.pdf"]
@@ -0,0 +1,34 @@
+import pytest
+
+from countries import CountryResolver
+
+RESOLVER = CountryResolver({"england": "GBR", "curaçao": "CUW"})
+
+
+@pytest.mark.parametrize(
+    "source,expected",
+    [
+        ("England", "GBR"),
+        ("Curaçao", "CUW"),
+        ("Spain", "ESP"),
+        ("USA", "USA"),
+        ("Bolivia", "BOL"),
+        (" india ", "IND"),
+        (None, ""),
+    ],
+)
+def test_resolver(source, expected):
+    assert RESOLVER(source) == expected
+
+
+def test_resolver_caches_fuzzy_search():
+    resolver = CountryResolver()
+    assert resolver("Korea") == resolver("Korea") != ""
+    stats = resolver.stats()
+    assert stats["misses"] == 2
+    assert stats["search"]["hits"] == 1
+    assert stats["search"]["misses"] == 1
+
+
+def test_resolver_exact_only():
+    assert CountryResolver(fuzzy=False)("Korea") == ""
@@ -0,0 +1,91 @@
+import io
+import json
+
+import pytest
+from botocore.exceptions import ClientError
+
+import dataset
+import schema
+
+pytest.importorskip("pyarrow")
+
+CASES = [
+    {"ID": "N1", "Country": "Brazil", "Country_ISO3": "BRA", "Status": "confirmed", "Date_confirmation": "2022-08-03"},
+    {"ID": "N2", "Country": "Brazil", "Country_ISO3": "BRA", "Status": "confirmed", "Date_confirmation": "2022-07-03"},
+    {"ID": "N3", "Country": "Brazil", "Country_ISO3": "BRA", "Status": "confirmed", "Date_confirmation": "2022-08-10"},
+    {"ID": "N4", "Country": "Spain", "Country_ISO3": "ESP", "Status": "suspected"},
+]
+
+
+class FakeClient:
+    def __init__(self):
+        self.objects = {}
+        self.uploads = []
+
+    def get_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise ClientError({"Error": {"Code": "NoSuchKey"}}, "GetObject")
+        return {"Body": io.BytesIO(self.objects[(Bucket, Key)])}
+
+    def upload_fileobj(self, fileobj, bucket, key, ExtraArgs=None, Config=None):
+        self.objects[(bucket, key)] = fileobj.read()
+        self.uploads.append(key)
+
+    def delete_objects(self, Bucket, Delete):
+        for o in Delete["Objects"]:
+            del self.objects[(Bucket, o["Key"])]
+        return {}
+
+
+def test_partitions():
+    files = dataset.partitions(schema.to_dataframe(CASES))
+    assert {k: v[:2] for k, v in files.items()} == {
+        "dataset/Country_ISO3=BRA/Confirmation_month=2022-07/part-0.parquet": (("BRA", "2022-07"), 1),
+        "dataset/Country_ISO3=BRA/Confirmation_month=2022-08/part-0.parquet": (("BRA", "2022-08"), 2),
+        "dataset/Country_ISO3=ESP/Confirmation_month=__HIVE_DEFAULT_PARTITION__/part-0.parquet":
+            (("ESP", "__HIVE_DEFAULT_PARTITION__"), 1),
+    }
+
+
+def test_partitions_have_same_schema(tmp_path):
+    ds = pytest.importorskip("pyarrow.dataset")
+    cases = [{**CASES[0], "Date_onset": "2022-07-30"}, CASES[3]]  # Date_onset empty in one partition
+    files = dataset.partitions(schema.to_dataframe(cases))
+    expected = schema.arrow_schema([f for f in schema.FIELDS if f != "Country_ISO3"])
+    for key, (_, _, body) in files.items():
+        (tmp_path / key).parent.mkdir(parents=True)
+        (tmp_path / key).write_bytes(body)
+        assert ds.dataset(tmp_path / key).schema.equals(expected)
+    table = ds.dataset(tmp_path / "dataset", partitioning="hive").to_table()
+    assert str(table.schema.field("Date_onset").type) == "date32[day]"
+
+
+def test_partitioned_read(tmp_path):
+    ds = pytest.importorskip("pyarrow.dataset")
+    for key, (_, _, body) in dataset.partitions(schema.to_dataframe(CASES)).items():
+        (tmp_path / key).parent.mkdir(parents=True)
+        (tmp_path / key).write_bytes(body)
+    table = ds.dataset(tmp_path / "dataset", partitioning="hive").to_table(
+        columns=["ID"], filter=(ds.field("Country_ISO3") == "BRA") & (ds.field("Confirmation_month") >= "2022-08"),
+    )
+    assert table.column("ID").to_pylist() == ["N1", "N3"]
+
+
+def test_publish_uploads_changed_partitions():
+    client = FakeClient()
+    manifest = dataset.publish(schema.to_dataframe(CASES), "bucket", client=client)
+    assert len(client.uploads) == 4 and client.uploads[-1] == "dataset/_manifest.json"
+    assert json.loads(client.objects[("bucket", "dataset/_manifest.json")]) == manifest
+    assert [f["rows"] for f in manifest["files"]] == [1, 2, 1]
+
+    client.uploads.clear()
+    cases = [c for c in CASES if c["ID"] != "N2"] + [{**CASES[1], "Status": "discarded"}]
+    dataset.publish(schema.to_dataframe(cases), "bucket", client=client)
+    assert client.uploads == ["dataset/Country_ISO3=BRA/Confirmation_month=2022-07/part-0.parquet",
+                              "dataset/_manifest.json"]
+
+    client.uploads.clear()
+    manifest = dataset.publish(schema.to_dataframe(CASES[2:]), "bucket", client=client)
+    assert client.uploads == ["dataset/Country_ISO3=BRA/Confirmation_month=2022-08/part-0.parquet",
+                              "dataset/_manifest.json"]
+    assert sorted(k for _, k in client.objects) == [f["key"] for f in manifest["files"]] + ["dataset/_manifest.json"]
@@ -0,0 +1,74 @@
+import io
+from datetime import datetime
+
+from botocore.exceptions import ClientError
+
+import document_store
+
+NOW = datetime(2022, 6, 1)
+
+
+class FakeClient:
+    def __init__(self):
+        self.objects = {}
+        self.uploads = []
+
+    def get_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise ClientError({"Error": {"Code": "NoSuchKey"}}, "GetObject")
+        return {"Body": io.BytesIO(self.objects[(Bucket, Key)])}
+
+    def upload_fileobj(self, fileobj, bucket, key, ExtraArgs=None, Config=None):
+        self.uploads.append(key)
+        self.objects[(bucket, key)] = fileobj.read()
+
+    def copy_object(self, Bucket, Key, CopySource):
+        self.objects[(Bucket, Key)] = self.objects[(CopySource["Bucket"], CopySource["Key"])]
+
+
+def test_store(tmp_path):
+    client = FakeClient()
+    store = document_store.DocumentStore("bucket", "sources", client)
+    (tmp_path / "a.pdf").write_bytes(b"%PDF a")
+    store.store("http://a.org/a.pdf", "a.pdf", str(tmp_path / "a.pdf"), {"ETag": '"1"', "sha256": "abc"}, NOW)
+    store.adopt("http://b.org/b.html", "b.pdf", NOW)
+    store.save()
+    assert client.uploads == ["sources/a.pdf", "sources/.manifest.json"]
+
+    store = document_store.DocumentStore("bucket", "sources", client)
+    assert store.validators("http://a.org/a.pdf", "a.pdf") == {"ETag": '"1"', "sha256": "abc"}
+    assert store.validators("http://a.org/a.pdf", "renamed.pdf") == {}
+    assert store.validators("http://b.org/b.html", "b.pdf") == {"adopted": True}
+    assert store.needs_fetch("http://a.org/a.pdf", "a.pdf", NOW)  # conditional request
+    assert not store.needs_fetch("http://b.org/b.html", "b.pdf", NOW)
+    assert store.needs_fetch("http://b.org/b.html", "b.pdf", NOW + document_store.MAX_AGE * 2)
+    assert store.needs_fetch("http://c.org/c.pdf", "c.pdf", NOW)
+
+    # fetched again with the same content, as a baseline for adopted documents
+    store.record("http://b.org/b.html", "b.pdf", {"sha256": "def"}, NOW + document_store.MAX_AGE * 2)
+    assert store.validators("http://b.org/b.html", "b.pdf") == {"sha256": "def"}
+    assert client.uploads == ["sources/a.pdf", "sources/.manifest.json"]
+
+
+def test_store_deduplicates_content(tmp_path):
+    client = FakeClient()
+    store = document_store.DocumentStore("bucket", "sources", client)
+    (tmp_path / "a.pdf").write_bytes(b"%PDF same")
+    (tmp_path / "b.pdf").write_bytes(b"%PDF same, rendered later")
+    assert store.store("http://a.org/", "a.pdf", str(tmp_path / "a.pdf"), {"sha256": "1"}, NOW) == "a.pdf"
+    assert store.stored_as("1", "b.pdf") == "a.pdf" and store.stored_as("1", "a.pdf") is None
+    assert store.store("http://b.org/", "b.pdf", str(tmp_path / "b.pdf"), {"sha256": "1"}, NOW) == "a.pdf"
+    assert store.record("http://c.org/", "c.pdf", {"sha256": "1"}, NOW) == "a.pdf"
+    assert client.uploads == ["sources/a.pdf"]
+    assert store.aliases() == {"b.pdf": "a.pdf", "c.pdf": "a.pdf"}
+    store.save()
+
+    # a.pdf changes, b.pdf and c.pdf keep the previous content, stored once
+    store = document_store.DocumentStore("bucket", "sources", client)
+    (tmp_path / "a.pdf").write_bytes(b"%PDF new")
+    assert store.store("http://a.org/", "a.pdf", str(tmp_path / "a.pdf"), {"sha256": "2"}, NOW) == "a.pdf"
+    assert client.uploads == ["sources/a.pdf", "sources/.manifest.json", "sources/a.pdf"]
+    assert client.objects[("bucket", "sources/b.pdf")] == b"%PDF same"
+    assert client.objects[("bucket", "sources/a.pdf")] == b"%PDF new"
+    assert store.aliases() == {"c.pdf": "b.pdf"}
+    assert store.stored_as("1", "d.pdf") == "b.pdf"
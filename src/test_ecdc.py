@@ -1,6 +1,9 @@
+import json
+
 import pytest
 from bs4 import BeautifulSoup
 
+import ecdc
 from ecdc import get_json_data, parse_line, NOTIF_DIV_ID, ONSET_DATE_DIV_ID, ONSET_OCA_DIV_ID
 
 
@@ -63,3 +66,50 @@ def test_get_json_data() -> dict[str]:
     except Exception:
         result = get_json_data(BeautifulSoup(html, "html.parser"), ONSET_OCA_DIV_ID)
     assert result == {"x": 1}
+
+
+def test_get_all_ecdc_data(monkeypatch):
+    notif = {"x": {"data": [{"text": ["DateNotif: 2022-05-05<br />count:   2", "invalid"]}]}}
+    onset = {"x": {"data": [{"text": "Date: 2022-05-05<br />count:   1<br />TypeDate: Notification"}]}}
+    page = f"""
+    <div id="{NOTIF_DIV_ID}"><script>{json.dumps(notif)}</script></div>
+    <div id="{ONSET_DATE_DIV_ID}"><script>{json.dumps(onset)}</script></div>
+    """
+    fetches = []
+    monkeypatch.setattr(ecdc, "fetch_page", lambda url: fetches.append(url) or page.encode("utf-8"))
+    result = ecdc.get_all_ecdc_data([NOTIF_DIV_ID, ONSET_DATE_DIV_ID], output=ecdc.Output.Native)
+    assert result == {
+        NOTIF_DIV_ID: [{"date": "2022-05-05", "count": 2}],
+        ONSET_DATE_DIV_ID: [{"date": "2022-05-05", "count": 1, "type": "Notification"}],
+    }
+    assert len(fetches) == 1
+
+
+def test_extract_scripts():
+    html = f"""
+    <div id="{NOTIF_DIV_ID}"><div class="inner"><p>Notifications</p>
+    <script type="application/json">{{"x": "<br />"}}</script></div></div>
+    <div id="other"><script>{{}}</script></div>
+    """.encode("utf-8")
+    assert ecdc.extract_scripts(html, [NOTIF_DIV_ID, ONSET_OCA_DIV_ID], chunk_size=16) == {
+        NOTIF_DIV_ID: '{"x": "<br />"}'
+    }
+
+
+def test_extract_scripts_malformed_divs():
+    html = f"""
+    <div id="{NOTIF_DIV_ID}"><p>Notifications</p>
+    <div id="other"><script>{{"other": 1}}</script></div>
+    <div id="{ONSET_OCA_DIV_ID}"><script>{{"x": 1}}</script></div>
+    """.encode("utf-8")
+    # the notification div is never closed, so the other div's script is not taken for its own
+    assert ecdc.extract_scripts(html, [NOTIF_DIV_ID, ONSET_OCA_DIV_ID]) == {ONSET_OCA_DIV_ID: '{"x": 1}'}
+
+
+def test_get_all_ecdc_data_falls_back_for_invalid_json(monkeypatch):
+    notif = {"x": {"data": [{"text": "DateNotif: 2022-05-05<br />count:   2"}]}}
+    extracted = {NOTIF_DIV_ID: "{not json"}
+    monkeypatch.setattr(ecdc, "extract_scripts", lambda content, divs: extracted)
+    page = f"""<div id="{NOTIF_DIV_ID}"><script>{json.dumps(notif)}</script></div>""".encode("utf-8")
+    result = ecdc.get_all_ecdc_data([NOTIF_DIV_ID], output=ecdc.Output.Native, content=page)
+    assert result == {NOTIF_DIV_ID: [{"date": "2022-05-05", "count": 2}]}
@@ -0,0 +1,52 @@
+import pytest
+
+import http_cache
+
+
+class FakeResponse:
+    def __init__(self, status_code, content=b"", headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(self.status_code)
+
+
+@pytest.fixture
+def session(monkeypatch, tmp_path):
+    monkeypatch.setattr(http_cache, "CACHE_DIR", tmp_path)
+    requests_sent = []
+
+    def request(method, url, json=None, headers=None, timeout=None):
+        requests_sent.append(headers)
+        if headers.get("If-None-Match") == '"v1"':
+            return FakeResponse(304)
+        return FakeResponse(200, b'{"a": 1}', {"ETag": '"v1"', "Content-Type": "application/json"})
+
+    monkeypatch.setattr(http_cache.SESSION, "request", request)
+    return requests_sent
+
+
+def test_get_uses_cache_when_not_modified(session):
+    first = http_cache.get("https://example.org/data.json")
+    second = http_cache.get("https://example.org/data.json")
+    assert not first.not_modified and second.not_modified
+    assert second.json() == first.json() == {"a": 1}
+    assert session == [{}, {"If-None-Match": '"v1"'}]
+
+
+def test_cache_key_includes_body(session):
+    http_cache.post("https://example.org/api", json_body={})
+    http_cache.post("https://example.org/api", json_body={"page": 2})
+    assert session == [{}, {}]
+
+
+def test_uncommitted_response_not_cached(session):
+    first = http_cache.get("https://example.org/data.json", commit=False)
+    second = http_cache.get("https://example.org/data.json")
+    assert not first.not_modified and not second.not_modified
+    first.commit()
+    assert http_cache.get("https://example.org/data.json").not_modified
+    assert session == [{}, {}, {"If-None-Match": '"v1"'}]
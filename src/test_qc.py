@@ -1,4 +1,7 @@
+import io
+
 import pytest
+import pandas as pd
 
 import qc
 
@@ -47,3 +50,63 @@ def test_valid_integer_range(source, expected):
 )
 def test_is_empty(source, expected):
     assert qc.is_empty(source) == expected
+
+
+@pytest.mark.parametrize(
+    "source,expected",
+    [
+        ("2020-01-01", True),
+        ("2020-1-1", True),
+        ("2024-02-29", True),
+        ("2023-02-29", False),
+        ("2022-13-01", False),
+        ("2022-06-01 ", False),
+        ("hello", False),
+        ("", True),
+    ],
+)
+def test_valid_date_column(source, expected):
+    assert qc.valid_date_column(pd.Series([source])).tolist() == [expected]
+    assert qc.valid_date(source) == expected
+
+
+def test_lint():
+    data = pd.read_csv(
+        io.StringIO(
+            """ID,Status,Country,Country_ISO3,Gender,Age,Date_confirmation,Source
+N1,confirmed,England,GBR,male,20-25,2022-06-01,https://example.com
+N2,confirmed,England,GBR,unknown,50-10,,http://example.com
+N3,suspected,Spain,es,female,,2022-02-30,example.com
+"""
+        )
+    )
+    assert qc.lint(data) == [
+        {
+            "id": "N2",
+            "line": 2,
+            "errors": [
+                {
+                    "field": "Date_confirmation",
+                    "value": "",
+                    "message": "Status=confirmed requires Date_confirmation",
+                }
+            ],
+        },
+        {
+            "id": "N2",
+            "line": 2,
+            "errors": [
+                {"field": "Gender", "value": "unknown"},
+                {"field": "Age", "value": "50-10"},
+            ],
+        },
+        {
+            "id": "N3",
+            "line": 3,
+            "errors": [
+                {"field": "Country_ISO3", "value": "es"},
+                {"field": "Date_confirmation", "value": "2022-02-30"},
+                {"field": "Source", "value": "example.com"},
+            ],
+        },
+    ]
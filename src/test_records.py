@@ -0,0 +1,24 @@
+import json
+import pickle
+
+from records import Record, RecordFactory
+
+CASE = {"ID": "N1", "Status": "confirmed", "Country": "England", "Age": 30}
+
+
+def test_record_is_read_only_mapping():
+    record = RecordFactory()(CASE)
+    assert record == CASE and dict(record) == CASE
+    assert list(record) == list(CASE)
+    assert record["Age"] == 30 and record.get("Notes", "") == ""
+    assert "Status" in record and "Notes" not in record
+    assert json.dumps(record, default=dict) == json.dumps(CASE)
+    assert pickle.loads(pickle.dumps(record)) == CASE
+
+
+def test_records_share_index_and_interned_values():
+    make_record = RecordFactory()
+    first, second = make_record(CASE), make_record(json.loads(json.dumps(CASE)))
+    assert first._index is second._index
+    assert first["Status"] is second["Status"]
+    assert isinstance(first, Record) and not hasattr(first, "__dict__")
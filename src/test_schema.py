@@ -0,0 +1,49 @@
+import io
+
+import pytest
+import pandas as pd
+
+import schema
+
+DATA = [
+    {"ID": "N1", "Status": "confirmed", "Age": 30, "Date_confirmation": "2022-06-01", "Contact_ID": ""},
+    {"ID": "N2", "Status": "suspected", "Age": "20-25", "Date_confirmation": "", "Contact_ID": 1},
+]
+
+
+def test_from_records():
+    df = schema.from_records(DATA)
+    assert list(df.columns) == schema.FIELDS
+    assert df.Age.tolist() == [30, "20-25"]
+    assert df.Date_confirmation.isna().tolist() == [False, True]
+
+
+def test_to_dataframe():
+    df = schema.to_dataframe(DATA)
+    assert list(df.columns) == schema.FIELDS
+    assert df.Status.dtype == "category"
+    assert df.Date_confirmation.tolist()[0] == pd.Timestamp(2022, 6, 1)
+    assert pd.isna(df.Date_confirmation.tolist()[1])
+    assert df.Age.tolist() == ["30", "20-25"]
+    assert df.Contact_ID.dtype == "Int64"
+
+
+def test_to_parquet():
+    pq = pytest.importorskip("pyarrow.parquet")
+    table = pq.read_table(io.BytesIO(schema.to_parquet(DATA)), columns=["ID", "Date_confirmation"])
+    assert str(table.schema.field("Date_confirmation").type) == "date32[day]"
+    assert table.column("ID").to_pylist() == ["N1", "N2"]
+
+
+def test_to_parquet_types_do_not_depend_on_values():
+    pq = pytest.importorskip("pyarrow.parquet")
+    empty = [{"ID": "N3", "Status": "confirmed"}]
+    for data in [DATA, empty]:
+        table = pq.read_table(io.BytesIO(schema.to_parquet(data)))
+        assert table.schema.equals(schema.arrow_schema())
+
+
+def test_to_dataframe_non_integral_integers():
+    df = schema.to_dataframe([{"ID": "N1", "Contact_ID": 1.5, "Status": "confirmed"}, {"ID": "N2", "Contact_ID": "2"}])
+    assert df.Contact_ID.tolist()[1] == 2
+    assert pd.isna(df.Contact_ID.tolist()[0])
@@ -0,0 +1,37 @@
+import sheets
+
+
+class FakeSheetAPI:
+    def __init__(self, worksheets):
+        self.worksheets = worksheets
+        self.requests = []
+
+    def values_batch_get(self, spreadsheet_id, value_ranges):
+        self.requests.append(value_ranges)
+        return [{"range": r, "values": self.worksheets[r.strip("'").replace("''", "'")]} for r in value_ranges]
+
+
+class FakeClient:
+    def __init__(self, worksheets):
+        self.sheet = FakeSheetAPI(worksheets)
+
+
+def test_get_records(monkeypatch):
+    client = FakeClient({
+        "Confirmed/Suspected": [["ID", "Age", "Status"], ["1", "30", "confirmed"], ["2"]],
+        "Endemic Countries": [["ID", "Status"], ["3", "suspected", "extra"]],
+    })
+    monkeypatch.setattr(sheets, "client", lambda: client)
+    assert sheets.get_records("doc", ["Confirmed/Suspected", "Endemic Countries"]) == {
+        "Confirmed/Suspected": [
+            {"ID": 1, "Age": 30, "Status": "confirmed"},
+            {"ID": 2, "Age": "", "Status": ""},
+        ],
+        "Endemic Countries": [{"ID": 3, "Status": "suspected"}],
+    }
+    assert client.sheet.requests == [["'Confirmed/Suspected'", "'Endemic Countries'"]]
+
+
+def test_sheet_range():
+    assert sheets.sheet_range("Cases by Country") == "'Cases by Country'"
+    assert sheets.sheet_range("Today's cases") == "'Today''s cases'"
@@ -0,0 +1,84 @@
+import io
+import re
+from datetime import datetime, timedelta
+
+from botocore.exceptions import ClientError
+
+import sheets
+import sheets_sync
+
+NOW = datetime(2022, 8, 1)
+HEADER = ["ID", "Status", "Country", "Date_last_modified"]
+
+
+class FakeClient:
+    def __init__(self):
+        self.objects = {}
+
+    def get_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise ClientError({"Error": {"Code": "NoSuchKey"}}, "GetObject")
+        return {"Body": io.BytesIO(self.objects[(Bucket, Key)])}
+
+    def upload_fileobj(self, fileobj, bucket, key, ExtraArgs=None, Config=None):
+        self.objects[(bucket, key)] = fileobj.read()
+
+
+class FakeSpreadsheet:
+    "Evaluates the A1 ranges used by sheets_sync against values of one worksheet"
+
+    def __init__(self, values):
+        self.values = values
+        self.ranges = []
+
+    def column(self, letters):
+        return [sheets_sync.column_letter(i) for i in range(26)].index(letters)
+
+    def get_range(self, a1):
+        self.ranges.append(a1)
+        _, cells = a1.split("!")
+        if m := re.fullmatch(r"(\d+):\1", cells):
+            return self.values[int(m[1]) - 1:int(m[1])]
+        if m := re.fullmatch(r"([A-Z]+):\1", cells):
+            i = self.column(m[1])
+            return [row[i:i + 1] for row in self.values]
+        m = re.fullmatch(r"A(\d+):([A-Z]+)(\d+)", cells)
+        return [row[:self.column(m[2]) + 1] for row in self.values[int(m[1]) - 1:int(m[3])]]
+
+    def get_ranges(self, document_id, ranges):
+        return [self.get_range(r) for r in ranges]
+
+    def get_values(self, document_id, titles):
+        self.ranges.append("all")
+        return {titles[0]: [list(row) for row in self.values]}
+
+
+def fake_spreadsheet(monkeypatch, values):
+    spreadsheet = FakeSpreadsheet(values)
+    monkeypatch.setattr(sheets, "get_ranges", spreadsheet.get_ranges)
+    monkeypatch.setattr(sheets, "get_values", spreadsheet.get_values)
+    return spreadsheet
+
+
+def test_column_letter():
+    assert [sheets_sync.column_letter(i) for i in [0, 25, 26, 27, 701, 702]] == ["A", "Z", "AA", "AB", "ZZ", "AAA"]
+
+
+def test_sync_reads_changed_rows(monkeypatch):
+    client = FakeClient()
+    values = [HEADER] + [[str(i), "confirmed", "Spain", "2022-07-01"] for i in range(1, 11)]
+    spreadsheet = fake_spreadsheet(monkeypatch, values)
+    assert sheets_sync.sync("doc", "Line list", "bucket", now=NOW, client=client) == values
+
+    values[2] = ["2", "confirmed", "Peru", "2022-07-31"]
+    values.append(["11", "suspected", "Iraq", "2022-07-31"])
+    spreadsheet.ranges = []
+    assert sheets_sync.sync("doc", "Line list", "bucket", now=NOW + timedelta(days=1), client=client) == values
+    assert spreadsheet.ranges[-2:] == ["'Line list'!A3:D3", "'Line list'!A12:D12"]
+    assert "all" not in spreadsheet.ranges
+
+    # rows removed: full refresh
+    del values[1]
+    spreadsheet.ranges = []
+    assert sheets_sync.sync("doc", "Line list", "bucket", now=NOW + timedelta(days=2), client=client) == values
+    assert spreadsheet.ranges[-1] == "all"
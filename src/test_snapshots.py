@@ -0,0 +1,32 @@
+import snapshots
+
+PREVIOUS = [
+    {"ID": "N1", "Status": "confirmed", "Date_last_modified": "2022-06-01"},
+    {"ID": "N2", "Status": "suspected", "Date_last_modified": "2022-06-01"},
+    {"ID": "N3", "Status": "suspected", "Date_last_modified": "2022-06-01"},
+]
+
+CURRENT = [
+    {"ID": "N1", "Status": "confirmed", "Date_last_modified": "2022-06-01"},
+    {"ID": "N2", "Status": "confirmed", "Date_last_modified": "2022-06-02"},
+    {"ID": "N4", "Status": "suspected", "Date_last_modified": "2022-06-02"},
+]
+
+
+def test_diff():
+    assert snapshots.diff(PREVIOUS, CURRENT) == {
+        "added": [CURRENT[2]],
+        "modified": [CURRENT[1]],
+        "omitted": ["N3"],
+    }
+
+
+def test_apply():
+    assert snapshots.apply(PREVIOUS, snapshots.diff(PREVIOUS, CURRENT)) == CURRENT
+
+
+def test_parse_key():
+    timestamp, kind = snapshots.parse_key("snapshots/2022-06-02 10:11:12.123456-delta.json.gz")
+    assert str(timestamp) == "2022-06-02 10:11:12.123456"
+    assert kind == snapshots.DELTA
+    assert snapshots.snapshot_key(timestamp, kind) == "snapshots/2022-06-02 10:11:12.123456-delta.json.gz"
@@ -1,8 +1,11 @@
 import io
+import logging
 
 import pandas as pd
+import pytest
 from pandas import Timestamp
 
+import schema
 import timeseries
 
 TODAY = pd.Timestamp(2022, 6, 9)
@@ -153,3 +156,78 @@ def test_by_country_confirmed():
         timeseries.by_country_confirmed(DATA, TODAY).to_dict("records")
         == BY_COUNTRY_CONFIRMED
     )
+
+
+def test_by_country_confirmed_typed():
+    df = schema.to_dataframe(DATA)
+    assert (
+        timeseries.by_country_confirmed(df, TODAY).to_dict("records")
+        == BY_COUNTRY_CONFIRMED
+    )
+
+
+def test_cumulative_counts_by_multiple_dimensions():
+    df = DATA[DATA.Country == "USA"].assign(Date=pd.to_datetime(DATA.Date_confirmation))
+    assert timeseries.cumulative_counts(
+        df, ["Country", "Status"], pd.Timestamp(2022, 6, 6)
+    ).to_dict("records") == [
+        {"Date": Timestamp("2022-06-02"), "Cases": 1, "Cumulative_cases": 1, "Country": "USA", "Status": "confirmed"},
+        {"Date": Timestamp("2022-06-03"), "Cases": 0, "Cumulative_cases": 1, "Country": "USA", "Status": "confirmed"},
+        {"Date": Timestamp("2022-06-04"), "Cases": 0, "Cumulative_cases": 1, "Country": "USA", "Status": "confirmed"},
+        {"Date": Timestamp("2022-06-05"), "Cases": 4, "Cumulative_cases": 5, "Country": "USA", "Status": "confirmed"},
+        {"Date": Timestamp("2022-06-06"), "Cases": 0, "Cumulative_cases": 5, "Country": "USA", "Status": "confirmed"},
+        {"Date": Timestamp("2022-06-05"), "Cases": 1, "Cumulative_cases": 1, "Country": "USA", "Status": "suspected"},
+        {"Date": Timestamp("2022-06-06"), "Cases": 0, "Cumulative_cases": 1, "Country": "USA", "Status": "suspected"},
+    ]
+
+
+def test_update_by_country_confirmed(caplog):
+    data = DATA.assign(Date_last_modified="2022-06-05")
+    previous = timeseries.by_country_confirmed(data, pd.Timestamp(2022, 6, 6))
+    data = pd.concat(
+        [
+            data,
+            pd.DataFrame(
+                [
+                    {"Status": "confirmed", "Date_confirmation": "2022-06-06", "Country": "Wales", "Date_last_modified": "2022-06-06"},
+                    {"Status": "confirmed", "Date_confirmation": "2022-06-08", "Country": "Peru", "Date_last_modified": "2022-06-08"},
+                ]
+            ),
+        ]
+    )
+    assert timeseries.update_start(data, previous) == pd.Timestamp(2022, 6, 6)
+    with caplog.at_level(logging.WARNING):
+        updated = timeseries.update_by_country_confirmed(data, previous, TODAY)
+    assert timeseries.to_csv(updated) == timeseries.to_csv(timeseries.by_country_confirmed(data, TODAY))
+    assert "recalculating" not in caplog.text
+
+
+def test_update_by_confirmed_recalculates_changed_history(caplog):
+    data = DATA.assign(Date_last_modified="2022-06-05")
+    previous = timeseries.by_confirmed(data, pd.Timestamp(2022, 6, 6))
+    # a case moved from 2022-06-03 to a later date, and another one removed
+    data = pd.concat(
+        [
+            data.drop(index=[2, 3]),
+            pd.DataFrame(
+                [{"Status": "confirmed", "Date_confirmation": "2022-06-08", "Country": "England", "Date_last_modified": "2022-06-08"}]
+            ),
+        ]
+    )
+    assert timeseries.update_start(data, previous) == pd.Timestamp(2022, 6, 7)
+    with caplog.at_level(logging.WARNING):
+        updated = timeseries.update_by_confirmed(data, previous, TODAY)
+    assert timeseries.to_csv(updated) == timeseries.to_csv(timeseries.by_confirmed(data, TODAY))
+    assert "recalculating" in caplog.text
+
+
+@pytest.mark.parametrize("column,value", [("Country", "USA"), ("Date_confirmation", "2022-06-02")])
+def test_update_by_country_confirmed_recalculates_unmarked_edits(caplog, column, value):
+    data = DATA.assign(Date_last_modified="2022-06-05")
+    previous = timeseries.by_country_confirmed(data, pd.Timestamp(2022, 6, 6))
+    # a case from 2022-06-03 edited without updating Date_last_modified
+    data.loc[1, column] = value
+    with caplog.at_level(logging.WARNING):
+        updated = timeseries.update_by_country_confirmed(data, previous, TODAY)
+    assert timeseries.to_csv(updated) == timeseries.to_csv(timeseries.by_country_confirmed(data, TODAY))
+    assert "recalculating" in caplog.text
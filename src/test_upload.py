@@ -0,0 +1,69 @@
+import threading
+
+import pytest
+
+import upload
+
+
+class FakeClient:
+    def __init__(self, failures: int = 0):
+        self.objects = {}
+        self.failures = failures
+        self.lock = threading.Lock()
+
+    def upload_fileobj(self, fileobj, bucket, key, ExtraArgs=None, Config=None):
+        with self.lock:
+            if self.failures:
+                self.failures -= 1
+                raise ConnectionError("connection reset")
+            self.objects[(bucket, key)] = fileobj.read()
+
+    def copy_object(self, Bucket, Key, CopySource):
+        with self.lock:
+            self.objects[(Bucket, Key)] = self.objects[(CopySource["Bucket"], CopySource["Key"])]
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(upload, "BACKOFF", 0)
+
+
+def test_put_objects_copies_aliases():
+    client = FakeClient()
+    timings = upload.put_objects(
+        {("bucket", "archives/1.csv"): "a,b\n", ("bucket", "archives/1.json"): b"[]"},
+        aliases={("bucket", "latest.csv"): ("bucket", "archives/1.csv")},
+        client=client,
+    )
+    assert client.objects == {
+        ("bucket", "archives/1.csv"): b"a,b\n",
+        ("bucket", "archives/1.json"): b"[]",
+        ("bucket", "latest.csv"): b"a,b\n",
+    }
+    assert set(timings) == set(client.objects)
+
+
+def test_put_objects_retries():
+    client = FakeClient(failures=upload.ATTEMPTS - 1)
+    upload.put_objects({("bucket", "key"): "data"}, client=client)
+    assert client.objects == {("bucket", "key"): b"data"}
+
+
+def test_put_objects_raises_after_retries():
+    client = FakeClient(failures=upload.ATTEMPTS)
+    with pytest.raises(ConnectionError):
+        upload.put_objects({("bucket", "key"): "data"}, client=client)
+
+
+def test_delete_objects_in_batches():
+    class DeletingClient:
+        def __init__(self):
+            self.batches = []
+
+        def delete_objects(self, Bucket, Delete):
+            self.batches.append([o["Key"] for o in Delete["Objects"]])
+            return {}
+
+    client = DeletingClient()
+    upload.delete_objects("bucket", [f"dataset/{i}" for i in range(2500)], client)
+    assert [len(b) for b in client.batches] == [1000, 1000, 500]
@@ -5,6 +5,8 @@ Based on code by @tannervarrelman
 
 """
 import io
+import logging
+
 import pandas as pd
 
 today = pd.Timestamp.today()
@@ -36,28 +38,131 @@ def by_confirmed(df: pd.DataFrame, last_date: pd.Timestamp = None) -> pd.DataFra
     )
 
 
+def from_csv(csv_data: str) -> pd.DataFrame:
+    return pd.read_csv(io.StringIO(csv_data), parse_dates=["Date"])
+
+
+def confirmed_cases(df: pd.DataFrame) -> pd.DataFrame:
+    confirmed = df[df.Status == "confirmed"]
+    return confirmed.assign(
+        Date=pd.to_datetime(confirmed.Date_confirmation),
+        Country=confirmed.Country.replace(UK_COUNTRIES, "United Kingdom"),
+    )
+
+
+def cumulative_counts(
+    df: pd.DataFrame, dimensions: list[str], last_date: pd.Timestamp = None
+) -> pd.DataFrame:
+    """Returns timeseries of counts and cumulative counts of rows in df by
+    dimensions, using the Date column. Each timeseries starts from the first
+    date with a nonzero count for that combination of dimensions."""
+
+    last_date = last_date or today
+    if not dimensions:
+        return cumulative_counts(df.assign(All=0), ["All"], last_date).drop(columns="All")
+    counts = df.groupby(dimensions + ["Date"]).size().unstack("Date", fill_value=0)
+    counts = counts.reindex(
+        columns=pd.date_range(counts.columns.min(), last_date, name="Date"),
+        fill_value=0,
+    )
+    cumulative = counts.cumsum(axis=1)
+    timeseries = pd.DataFrame(
+        {"Cases": counts.stack(), "Cumulative_cases": cumulative.stack()}
+    )
+    return (
+        timeseries[cumulative.stack() > 0]
+        .reset_index()[["Date", "Cases", "Cumulative_cases", *dimensions]]
+    )
+
+
 def by_country_confirmed(
     df: pd.DataFrame, last_date: pd.Timestamp = None
 ) -> pd.DataFrame:
     """Returns timeseries of counts and cumulative counts of cases by country"""
 
+    return cumulative_counts(confirmed_cases(df), ["Country"], last_date)
+
+
+def counts_digest(counts: pd.Series) -> int:
+    "Returns checksum of nonzero counts indexed by dimensions and Date"
+    return int(pd.util.hash_pandas_object(counts[counts > 0]).sum())
+
+
+def update_cumulative_counts(
+    df: pd.DataFrame,
+    previous: pd.DataFrame,
+    dimensions: list[str],
+    start: pd.Timestamp,
+    last_date: pd.Timestamp = None,
+) -> pd.DataFrame:
+    """Returns the same timeseries as cumulative_counts(), reusing rows of a
+    previous timeseries before start and only counting rows of df from start.
+
+    Falls back to recounting everything if the counts of df before start
+    (by dimensions and date) do not match the previous timeseries, as rows
+    can be edited without updating Date_last_modified. Rows are grouped
+    once, and those counts are split at start.
+    """
+
     last_date = last_date or today
-    confirmed = df[df.Status == "confirmed"]
-    confirmed = confirmed.assign(
-        Date=pd.to_datetime(confirmed.Date_confirmation),
-        Country=confirmed.Country.replace(UK_COUNTRIES, "United Kingdom"),
+    if not dimensions:
+        return update_cumulative_counts(
+            df.assign(All=0), previous.assign(All=0), ["All"], start, last_date
+        ).drop(columns="All")
+
+    kept = previous[previous.Date < start]
+    all_counts = df.groupby(dimensions + ["Date"]).size()
+    before = all_counts.index.get_level_values("Date") < start
+    if counts_digest(all_counts[before]) != counts_digest(kept.set_index(dimensions + ["Date"]).Cases):
+        logging.warning(f"Timeseries before {start.date()} changed, recalculating all dates")
+        return cumulative_counts(df, dimensions, last_date)
+
+    baseline = kept.groupby(dimensions).Cumulative_cases.last()
+    counts = all_counts[~before].unstack("Date", fill_value=0)
+    counts = counts.reindex(
+        index=counts.index.union(baseline.index),
+        columns=pd.date_range(start, last_date, name="Date"),
+        fill_value=0,
+    )
+    cumulative = counts.cumsum(axis=1).add(baseline.reindex(counts.index, fill_value=0), axis=0)
+    timeseries = pd.DataFrame(
+        {"Cases": counts.stack(), "Cumulative_cases": cumulative.stack()}
+    )
+    updated = timeseries[cumulative.stack() > 0].astype(int).reset_index()
+    return (
+        pd.concat([kept, updated])
+        .sort_values(dimensions + ["Date"], kind="stable")
+        .reset_index(drop=True)[["Date", "Cases", "Cumulative_cases", *dimensions]]
+    )
+
+
+def update_start(df: pd.DataFrame, previous: pd.DataFrame) -> pd.Timestamp:
+    """Returns earliest date from which a previous timeseries needs updating:
+    the day after its last date, or the earliest Date_confirmation of cases
+    modified since then"""
+
+    last_run = previous.Date.max()
+    modified = df[pd.to_datetime(df.Date_last_modified, errors="coerce") >= last_run]
+    start = pd.to_datetime(modified.Date_confirmation, errors="coerce").min()
+    next_day = last_run + pd.Timedelta(days=1)
+    return next_day if pd.isna(start) else min(start, next_day)
+
+
+def update_by_confirmed(
+    df: pd.DataFrame, previous: pd.DataFrame, last_date: pd.Timestamp = None
+) -> pd.DataFrame:
+    """Returns by_confirmed(df, last_date), updating a previous timeseries"""
+
+    return update_cumulative_counts(
+        confirmed_cases(df), previous, [], update_start(df, previous), last_date
+    )
+
+
+def update_by_country_confirmed(
+    df: pd.DataFrame, previous: pd.DataFrame, last_date: pd.Timestamp = None
+) -> pd.DataFrame:
+    """Returns by_country_confirmed(df, last_date), updating a previous timeseries"""
+
+    return update_cumulative_counts(
+        confirmed_cases(df), previous, ["Country"], update_start(df, previous), last_date
     )
-    dfs = []
-    for country, country_df in confirmed.groupby("Country"):
-        country_counts = country_df.groupby("Date").size().resample("D").sum()
-        country_counts = country_counts.reindex(
-            pd.date_range(country_counts.index.min(), last_date),
-            fill_value=0,
-        )
-        dfs.append(
-            pd.DataFrame([country_counts, country_counts.cumsum()])
-            .T.reset_index()
-            .rename(columns={0: "Cases", 1: "Cumulative_cases", "index": "Date"})
-            .assign(Country=country)
-        )
-    return pd.concat(dfs).reset_index().drop("index", axis=1)
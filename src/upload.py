@@ -0,0 +1,134 @@
+"""
+Upload objects to S3 concurrently
+
+All uploads share one connection pooled client and a bounded thread pool.
+Objects over a size threshold are sent as multipart uploads, aliases of
+uploaded objects are created with server side copies, and failed requests
+are retried with exponential backoff.
+"""
+
+import io
+import time
+import logging
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import IO, Callable, Optional
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+
+MAX_WORKERS = 8
+MULTIPART_THRESHOLD = 16 * 1024 * 1024
+ATTEMPTS = 3
+BACKOFF = 1.0  # seconds, doubled after each failed attempt
+
+S3_CLIENT = boto3.client("s3", config=Config(max_pool_connections=MAX_WORKERS))
+TRANSFER_CONFIG = TransferConfig(multipart_threshold=MULTIPART_THRESHOLD, multipart_chunksize=MULTIPART_THRESHOLD)
+
+Key = tuple[str, str]  # (bucket, key)
+
+
+def with_retries(func: Callable, description: str):
+    for attempt in range(ATTEMPTS):
+        try:
+            return func()
+        except Exception:
+            if attempt == ATTEMPTS - 1:
+                raise
+            logging.warning(f"Attempt {attempt + 1} to {description} failed, retrying")
+            time.sleep(BACKOFF * 2 ** attempt)
+
+
+def put_object(bucket: str, key: str, body: str | bytes | IO[bytes], client=None, **extra_args) -> float:
+    "Uploads body to bucket/key, returns time taken in seconds"
+    client = client or S3_CLIENT
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    if isinstance(body, bytes):
+        body = io.BytesIO(body)
+
+    def put():
+        body.seek(0)
+        client.upload_fileobj(body, bucket, key, ExtraArgs=extra_args or None, Config=TRANSFER_CONFIG)
+
+    start = time.perf_counter()
+    with_retries(put, f"upload {bucket}/{key}")
+    return time.perf_counter() - start
+
+
+def copy_object(bucket: str, key: str, source: Key, client=None) -> float:
+    "Copies source object to bucket/key within S3, returns time taken in seconds"
+    client = client or S3_CLIENT
+    source_bucket, source_key = source
+    start = time.perf_counter()
+    with_retries(
+        lambda: client.copy_object(
+            Bucket=bucket, Key=key, CopySource={"Bucket": source_bucket, "Key": source_key}
+        ),
+        f"copy {source_bucket}/{source_key} to {bucket}/{key}",
+    )
+    return time.perf_counter() - start
+
+
+def put_objects(
+    objects: dict[Key, str | bytes | IO[bytes]],
+    aliases: Optional[dict[Key, Key]] = None,
+    extra_args: Optional[dict[Key, dict[str, str]]] = None,
+    client=None,
+    max_workers: int = MAX_WORKERS,
+) -> dict[Key, float]:
+    """Uploads objects concurrently, then copies each source of aliases
+    (alias -> source) as soon as the source has been uploaded
+
+    Returns time taken in seconds for each upload and copy. If any upload
+    fails, the remaining ones still complete before the first exception
+    is raised.
+    """
+    aliases = aliases or {}
+    extra_args = extra_args or {}
+    timings = {}
+    errors = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(put_object, *key, body, client, **extra_args.get(key, {})): key
+            for key, body in objects.items()
+        }
+        # sources which are not uploaded here are assumed to exist already
+        for alias, source in aliases.items():
+            if source not in objects:
+                futures[executor.submit(copy_object, *alias, source, client)] = alias
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                key = futures[future]
+                try:
+                    timings[key] = future.result()
+                except Exception as exc:
+                    logging.error(f"Failed to store {'/'.join(key)}: {exc}")
+                    errors.append(exc)
+                    continue
+                logging.info(f"Stored {'/'.join(key)} in {timings[key]:.2f}s")
+                for alias, source in aliases.items():
+                    if source == key and key in objects:
+                        copy = executor.submit(copy_object, *alias, source, client)
+                        futures[copy] = alias
+                        pending.add(copy)
+    if errors:
+        raise errors[0]
+    return timings
+
+
+def delete_objects(bucket: str, keys: list[str], client=None):
+    "Deletes keys from bucket, in batches of the 1000 keys allowed per request"
+    client = client or S3_CLIENT
+    for i in range(0, len(keys), 1000):
+        batch = keys[i:i + 1000]
+        response = with_retries(
+            lambda: client.delete_objects(
+                Bucket=bucket, Delete={"Objects": [{"Key": k} for k in batch], "Quiet": True}
+            ),
+            f"delete {len(batch)} objects from {bucket}",
+        )
+        if errors := response.get("Errors"):
+            raise RuntimeError(f"Failed to delete {len(errors)} objects from {bucket}, first: {errors[0]}")